@@ -64,8 +64,17 @@ class QTDC_API:
         else:
             self.qtdc.hide()
 
-    def loadLayer(self, maplayer, timeattr, interval=None, color=None, labelexpr=None):
-        # loadLayer(maplayer, timeattr, interval, color, labelexpr):
+    def loadLayer(
+        self,
+        maplayer,
+        timeattr,
+        interval=None,
+        color=None,
+        labelexpr=None,
+        pagesize=None,
+        followextent=False,
+    ):
+        # loadLayer(maplayer, timeattr, interval, color, labelexpr, pagesize, followextent):
         #       Load a map layer in QTDC as a time data layer
         #
         # Parameters:
@@ -74,6 +83,10 @@ class QTDC_API:
         #   interval (string)           : Optional: End time attribute
         #   color (string)              : Optional: The attribute for 'color by attribute' rendering
         #   labelexpr (string)          : Optional: The expression to use for generating label text
+        #   pagesize (float)            : Optional: Load the layer in time tiles of this many seconds
+        #                                 around the playhead instead of all at once
+        #   followextent (bool)         : Optional: Load only the features in the map extent, and
+        #                                 more as the map is moved
         #
         # Returns:
         #   layeruid (uuid)           : String version of the UUID for the loaded layer. Returns None if firstfeature not found.
@@ -86,6 +99,8 @@ class QTDC_API:
         loadstate.epochfield = timeattr
         loadstate.durationfield = interval
         loadstate.colorattr = color
+        loadstate.pagesize = pagesize
+        loadstate.followextent = followextent
         if labelexpr is not None:
             loadstate.labelExpression = QgsExpression(labelexpr)
 
@@ -132,6 +147,7 @@ class QTDC_API:
             # Make the timedatalayer and connect the necessary callbacks for re-loading
             timedatalayer = TimeDataLayer(self.timeplayer.canvas, maplayer, loadstate)
             timedatalayer.layerUpdate.connect(self.timeplayer.updated)
+            timedatalayer.layerExtend.connect(self.timeplayer.extended)
             timedatalayer.layerReload.connect(self.timeplayer.reloadmaplayer)
 
             # Spawn a task to perform the actual loading of data into the layer. The timeplayer.loadingComplete method is called when done.
@@ -177,8 +193,8 @@ class QTDC_API:
 
         # Push the new data to the layer if one was returned
         if timedatalayer:
-            timedatalayer.updateLayer(datalist)
-            timedatalayer.layerUpdate.emit(timedatalayer)
+            if timedatalayer.updateLayer(datalist):
+                timedatalayer.layerUpdate.emit(timedatalayer)
         else:
             QgsMessageLog.logMessage(
                 "API*** - Layer with uid: " + str(uid) + " not found.",
@@ -281,6 +297,34 @@ class QTDC_API:
             fids = timedatalayer.getWindowDataIds()
         return fids
 
+    def getHistogram(self, uid, tmin, tmax, bins):
+        # getHistogram(uid, tmin, tmax, bins):  Get the timeline histogram counts for the layer with uid
+        #
+        # Parameters:
+        #   uid (uuid)     : The uid that was created for the layer when it was loaded
+        #   tmin (double)  : epoch seconds of the timeline start time
+        #   tmax (double)  : epoch seconds of the timeline end time
+        #   bins (int)     : The number of histogram bins
+        #
+        # Returns:
+        #   counts (list)  : The number of features in each of the bins evenly spaced from tmin to tmax.
+        #                    For layers with an end time, the number of features active at
+        #                    each of 'bins' times evenly spaced from tmin to tmax.
+        #
+
+        timedatalayer = self.timeplayer.getLayer(uid)
+        counts = []
+        if timedatalayer is not None and not timedatalayer.isLoading:
+            # Timeline times are offset from the data by the layer's time shift
+            tmin += timedatalayer.timeshift
+            tmax += timedatalayer.timeshift
+            if timedatalayer.isdurationlayer():
+                count = bins
+            else:
+                count = bins + 1
+            counts = timedatalayer.histogram.counts(tmin, tmax, count).tolist()
+        return counts
+
     def getTimeWindow(self):
         # getTimeWindow():  Get the min and max times of the timeline time window.
         #
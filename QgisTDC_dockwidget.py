@@ -432,6 +432,15 @@ class QTDC_DockWidget(QtWidgets.QDockWidget, FORM_CLASS):
 
         self.setplaylabel(not self.timeplayer.isAnimating())
 
+    def extendLoading(self, tdlayer):
+        # This method is called as more data of a loading layer arrives.  The histograms are
+        # regenerated for the current timeline range, which is left as the user set it.
+        if tdlayer:
+            self.overview.setextent(self.timeplayer.mintime, self.timeplayer.maxtime)
+            self.overview.refreshrange()
+            self.timeline.resize()
+            self.refreshtimelabel(self.timeplayer.mintime, self.timeplayer.maxtime)
+
     def refreshtimelabel(self, tmin, tmax):
         try:
             if self.timeline.histocount() >= 1:
@@ -0,0 +1,197 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+#
+# This class is a container for converting whole columns of raw time values to epoch seconds.
+#
+# A date parser (see LoadLayerProcessor) may provide parseDates(values), which converts a list
+# of raw values in vectorized passes and returns the times along with a mask of the rows it
+# handled.  Rows it could not handle, and all rows for parsers without parseDates, are passed
+# to the parser's parseDate one at a time, so results always match the per-row parser.
+#
+# Fixed layout date strings are handled on a grid of character codes: the strings are laid out
+# in a NumPy unicode array whose code points are viewed as a 2-D integer array, so each date
+# component is read from the same columns of every row at once.
+#
+class bulkTimeParser:
+
+    chunksize = 200000  # Rows converted per vectorized pass
+    maxlength = 40  # Longer strings are left to the per-row parser
+    exactlimit = 2 ** 53  # Integers beyond this cannot be converted to float exactly
+
+    @staticmethod
+    def parse(formatter, values):
+        #
+        # Convert a list of raw time values with the given date parser.
+        # Returns the times (float64), a mask of the rows that parsed and the number of rows
+        # that needed the per-row parser.
+        #
+        count = len(values)
+        times = np.full(count, np.nan)
+        ok = np.zeros(count, dtype=bool)
+        bulk = getattr(formatter, "parseDates", None)
+        if bulk is not None:
+            for start in range(0, count, bulkTimeParser.chunksize):
+                end = min(start + bulkTimeParser.chunksize, count)
+                times[start:end], ok[start:end] = bulk(values[start:end])
+
+        slowrows = np.flatnonzero(~ok).tolist()
+        for i in slowrows:
+            try:
+                times[i] = formatter.parseDate(values[i])
+                ok[i] = True
+            except Exception:
+                pass
+        return times, ok, len(slowrows)
+
+    @staticmethod
+    def numbers(values, divisor):
+        #
+        # Convert int and float values to float and divide by 'divisor' (other types are not handled)
+        #
+        isnumber = np.fromiter(
+            (type(v) is float or type(v) is int for v in values),
+            dtype=bool,
+            count=len(values),
+        )
+        times = np.full(len(values), np.nan)
+        times[isnumber] = np.fromiter(
+            (v for v, n in zip(values, isnumber.tolist()) if n),
+            dtype=np.float64,
+            count=int(isnumber.sum()),
+        )
+        if divisor != 1:
+            times /= divisor
+        return times, isnumber
+
+    @staticmethod
+    def codepoints(values):
+        #
+        # Lay out string values as a 2-D array of character codes (one row per value, zero padded)
+        # along with the length of each string.  Other values and overlong strings become empty.
+        #
+        limit = bulkTimeParser.maxlength
+        strings = [v if type(v) is str and len(v) <= limit else "" for v in values]
+        text = np.array(strings)
+        width = text.dtype.itemsize // 4
+        codes = np.zeros((len(strings), max(width, 27)), dtype=np.int32)
+        codes[:, :width] = text.view(np.uint32).reshape(len(strings), width)
+        return codes, np.char.str_len(text)
+
+    @staticmethod
+    def number(codes, start, count):
+        # Read the 'count' decimal digits at 'start' in each row; also returns the rows that are all digits
+        digits = codes[:, start : start + count].astype(np.int64) - 48
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        value = (digits * (10 ** np.arange(count - 1, -1, -1))).sum(axis=1)
+        return value, valid
+
+    @staticmethod
+    def characters(codes, positions, char):
+        # Get the rows where all of the given positions hold 'char'
+        return (codes[:, positions] == ord(char)).all(axis=1)
+
+    @staticmethod
+    def lastcharacter(codes, lengths, char):
+        # Get the rows whose last character is 'char'
+        last = codes[np.arange(len(codes)), np.maximum(lengths - 1, 0)]
+        return (lengths > 0) & (last == ord(char))
+
+    @staticmethod
+    def fixedfields(codes):
+        #
+        # Read the year, month, day, hour, minute and second of 'YYYY?MM?DD?HH?MM?SS' layouts
+        # and convert them to seconds since the epoch (UTC).  Returns the seconds and the rows
+        # that hold digits in every field and form a valid date and time.
+        #
+        valid = np.ones(len(codes), dtype=bool)
+        fields = []
+        for start, count in ((0, 4), (5, 2), (8, 2), (11, 2), (14, 2), (17, 2)):
+            value, digits = bulkTimeParser.number(codes, start, count)
+            fields.append(value)
+            valid &= digits
+        year, month, day, hour, minute, second = fields
+        valid &= (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1)
+        valid &= (hour < 24) & (minute < 60) & (second < 60)
+
+        # Day numbers of the first of the month and the first of the next month
+        years = np.where(valid, year, 1970) - 1970
+        months = np.where(valid, month, 1) - 1
+        monthstart = years.astype("datetime64[Y]").astype("datetime64[M]") + months
+        firstday = monthstart.astype("datetime64[D]").astype(np.int64)
+        nextday = (monthstart + 1).astype("datetime64[D]").astype(np.int64)
+        valid &= day <= (nextday - firstday)
+
+        seconds = (firstday + day - 1) * 86400 + hour * 3600 + minute * 60 + second
+        return seconds, valid
+
+    @staticmethod
+    def fraction(codes, lengths, start, pad):
+        #
+        # Read a fraction of 1 to 6 digits from 'start' to the end of each string.  With 'pad' the
+        # digits are right padded to microseconds (as strptime's %f), otherwise the digits are
+        # read as an integer.
+        #
+        micro = np.zeros(len(codes), dtype=np.int64)
+        valid = np.zeros(len(codes), dtype=bool)
+        digitcount = lengths - start
+        for count in range(1, 7):
+            rows = digitcount == count
+            if rows.any():
+                value, digits = bulkTimeParser.number(codes[rows], start, count)
+                if pad:
+                    value = value * 10 ** (6 - count)
+                micro[rows] = value
+                valid[rows] = digits
+        return micro, valid
+
+    @staticmethod
+    def utcTimes(seconds, micro, valid):
+        #
+        # Convert UTC seconds and microseconds to float epoch seconds exactly as
+        # datetime.timestamp() does for aware datetimes (microseconds / 10**6)
+        #
+        total = seconds * 1000000 + micro
+        valid &= np.abs(total) < bulkTimeParser.exactlimit
+        return np.where(valid, total, 0).astype(np.float64) / 1e6, valid
+
+    @staticmethod
+    def localTimes(seconds, micro, valid):
+        #
+        # Convert naive (local time) seconds and microseconds to float epoch seconds as
+        # datetime.timestamp() does for naive datetimes.  The UTC offset is found once for each
+        # hour present; rows in an hour where the offset changes are left to the per-row parser.
+        #
+        times = np.full(len(seconds), np.nan)
+        if not valid.any():
+            return times, valid
+        hours = seconds // 3600
+        uniquehours, inverse = np.unique(hours[valid], return_inverse=True)
+        offsets = np.zeros(len(uniquehours), dtype=np.int64)
+        uniform = np.zeros(len(uniquehours), dtype=bool)
+        epoch = datetime(1970, 1, 1)
+        for i, hour in enumerate(uniquehours.tolist()):
+            try:
+                first = epoch + timedelta(hours=hour)
+                last = first + timedelta(seconds=3599)
+                firstoffset = int(first.timestamp()) - hour * 3600
+                lastoffset = int(last.timestamp()) - (hour * 3600 + 3599)
+                offsets[i] = firstoffset
+                uniform[i] = firstoffset == lastoffset
+            except (OverflowError, OSError, ValueError):
+                pass
+        rows = np.flatnonzero(valid)
+        valid[rows] = uniform[inverse]
+        local = seconds[rows] + offsets[inverse]
+        times[rows] = local.astype(np.float64) + micro[rows] / 1e6
+        times[~valid] = np.nan
+        return times, valid
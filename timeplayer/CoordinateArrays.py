@@ -0,0 +1,117 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import numpy as np
+
+from qgis.PyQt.QtGui import QPolygonF
+from qgis.core import QgsCsException, QgsLineString, QgsPointXY
+
+#
+# This class is a container for whole-array operations on coordinate buffers: CRS transformation,
+# projection to canvas coordinates and conversion to Qt polygons.
+#
+class coordinateArrays:
+
+    # Number of vertices handed to a single QgsLineString when transforming
+    transformChunk = 1000000
+
+    @staticmethod
+    def transform(xform, x, y):
+        #
+        # Transform the coordinate arrays x and y in place with a QgsCoordinateTransform.
+        # The vertices are passed through a QgsLineString so the transformation runs in a single
+        # call per chunk. If a chunk fails, its vertices are transformed individually and any that
+        # cannot be transformed are set to NaN.
+        #
+        chunk = coordinateArrays.transformChunk
+        for start in range(0, len(x), chunk):
+            end = min(start + chunk, len(x))
+            line = QgsLineString(x[start:end].tolist(), y[start:end].tolist())
+            try:
+                line.transform(xform)
+                x[start:end] = line.xVector()
+                y[start:end] = line.yVector()
+            except QgsCsException:
+                for i in range(start, end):
+                    try:
+                        p = xform.transform(QgsPointXY(x[i], y[i]))
+                        x[i] = p.x()
+                        y[i] = p.y()
+                    except QgsCsException:
+                        x[i] = np.nan
+                        y[i] = np.nan
+
+    @staticmethod
+    def canvasAffine(item):
+        #
+        # Get the affine map from map coordinates to the coordinates of a QgsMapCanvasItem.
+        # The map is sampled at the canvas center and at points offset along each axis, so
+        # rotation and panning offsets are included.
+        #
+        center = item.canvas.extent().center()
+        step = item.canvas.mapUnitsPerPixel() * 100
+        p0 = item.toCanvasCoordinates(center)
+        px = item.toCanvasCoordinates(QgsPointXY(center.x() + step, center.y()))
+        py = item.toCanvasCoordinates(QgsPointXY(center.x(), center.y() + step))
+        return (
+            center.x(),
+            center.y(),
+            p0.x(),
+            p0.y(),
+            (px.x() - p0.x()) / step,
+            (py.x() - p0.x()) / step,
+            (px.y() - p0.y()) / step,
+            (py.y() - p0.y()) / step,
+        )
+
+    @staticmethod
+    def project(affine, xy):
+        #
+        # Project an (n, 2) array of map coordinates to canvas coordinates
+        #
+        cx, cy, ox, oy, a, b, c, d = affine
+        dx = xy[:, 0] - cx
+        dy = xy[:, 1] - cy
+        result = np.empty((len(xy), 2), dtype=np.float64)
+        result[:, 0] = ox + a * dx + b * dy
+        result[:, 1] = oy + c * dx + d * dy
+        return result
+
+    @staticmethod
+    def projectRows(affine, store, rows, screen=None):
+        #
+        # Project the geometry of the given store rows to canvas coordinates in one array operation.
+        # Returns the (n, 2) canvas vertices along with, for stores with vertex buffers, the
+        # offsets of each row's parts and of each part's vertices in them (None for points).
+        # If 'screen' holds the canvas coordinates of all the store's vertices (or points), those
+        # of the rows are gathered from it instead of projected.
+        #
+        if not store.hasvertices:
+            if screen is not None:
+                return screen[rows], None, None
+            xy = np.column_stack((store.x[rows], store.y[rows]))
+            return coordinateArrays.project(affine, xy), None, None
+        partindex, partoffsets = store.raggedIndex(store.featureoffsets, rows)
+        vertexindex, vertexoffsets = store.raggedIndex(store.partoffsets, partindex)
+        if screen is not None:
+            return screen[vertexindex], partoffsets, vertexoffsets
+        screen = coordinateArrays.project(affine, store.coords[vertexindex])
+        return screen, partoffsets, vertexoffsets
+
+    @staticmethod
+    def toQPolygonF(xy):
+        #
+        # Build a QPolygonF from an (n, 2) float64 array by copying into the polygon's point buffer
+        #
+        n = len(xy)
+        polygon = QPolygonF(n)
+        if n > 0:
+            buffer = polygon.data()
+            buffer.setsize(n * 16)
+            np.frombuffer(buffer, dtype=np.float64).reshape((n, 2))[:] = xy
+        return polygon
@@ -0,0 +1,230 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import numpy as np
+
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsMessageLog,
+    QgsProject,
+    QgsTask,
+    QgsVectorLayerFeatureSource,
+)
+
+from .SpatialGrid import SpatialGrid
+from .TimeDataStore import TimeDataStore
+
+
+class ExtentLoader:
+    """Loads the features of a time data layer that fall inside the map extent"""
+
+    #
+    # Instead of the whole layer, only the features inside the canvas extent grown by 'margin'
+    # (a fraction of its width and height on each side) are loaded, using a filter rectangle so
+    # providers with a spatial index read only those features.  As the map is panned or zoomed
+    # out, the features of the newly exposed region are fetched by a background task and merged
+    # into the layer's time ordered store.  Regions are tracked as the rectangles already loaded
+    # and features already in the store are skipped, so overlapping fetches add no duplicates.
+    # Rows beyond 'evictmargin' of the view are dropped after each fetch, and the loaded
+    # regions are trimmed to the current request rectangle, so memory follows the map view
+    # rather than every region ever visited.
+    #
+
+    margin = 0.25
+    evictmargin = 2.0
+
+    def __init__(self, datalayer, maplayer, attridx):
+        self.datalayer = datalayer
+        self.maplayer = maplayer
+        self.attridx = attridx
+        self.loaded = []  # Rectangles (in the layer CRS) whose features are loaded
+        self.task = None
+        self.queued = False
+
+    @staticmethod
+    def canvasRect(canvas, maplayer):
+        #
+        # Get the canvas extent grown by the margin, in the CRS of the map layer.  It reads
+        # the canvas, so it is only called on the main thread.
+        #
+        extent = canvas.extent()
+        extent.grow(ExtentLoader.margin * max(extent.width(), extent.height()))
+        xform = QgsCoordinateTransform(
+            canvas.mapSettings().destinationCrs(),
+            maplayer.sourceCrs(),
+            QgsProject.instance(),
+        )
+        try:
+            return xform.transformBoundingBox(extent)
+        except QgsCsException:
+            return maplayer.extent()
+
+    def requestRect(self):
+        return ExtentLoader.canvasRect(self.datalayer.canvas, self.maplayer)
+
+    def start(self, task, rect):
+        #
+        # Load the features in 'rect', the extent captured on the main thread before the
+        # load task started (called from the load task).  Returns the store for the layer.
+        #
+        result = self.loadRect(task, self.maplayer, self.rectRequest(rect), None)
+        if result is None:  # Task was cancelled
+            return None
+        store, unrendered = result
+        self.datalayer.noteRows(store, unrendered)
+        self.loaded.append(rect)
+        return store
+
+    def rectRequest(self, rect):
+        #
+        # Build the feature request for the features inside 'rect'.  It reads the map layer's
+        # renderer and fields, so it is built before a background task starts.
+        #
+        request = self.datalayer.featureRequest(self.attridx)
+        request.setFilterRect(rect)
+        return request
+
+    def loadRect(self, task, source, request, knownfids):
+        #
+        # Read the features of 'request' from 'source' (the map layer or a feature source) that
+        # are not in 'knownfids' into a new time ordered store.  Only the new store is written,
+        # so this can run in a background task.  Returns the store and the number of features
+        # the renderer does not render (see TimeDataLayer.noteRows), or None if cancelled.
+        #
+        layer = self.datalayer
+        store = TimeDataStore(layer.store.elementclass)
+        epochvalues = []
+        durationvalues = []
+        retstatus, badrows, unrendered = layer.stageFeatures(
+            task,
+            source.getFeatures(request),
+            self.attridx,
+            store,
+            epochvalues,
+            durationvalues,
+            None,
+        )
+        if not retstatus:  # Task was cancelled
+            return None
+        layer.commitFeatures(store, epochvalues, durationvalues, badrows)
+        if knownfids is not None:
+            store.select(np.flatnonzero(~np.isin(store.fid, knownfids)))
+        store.mergeSorted(0)
+        return store, unrendered
+
+    def follow(self):
+        #
+        # Called on the main thread when the canvas extent changes: fetch the features of the
+        # new extent unless it is already loaded
+        #
+        if not self.loaded:  # The first extent is still loading
+            return
+        rect = self.requestRect()
+        if any(loaded.contains(rect) for loaded in self.loaded):
+            return
+        if self.task is not None:  # Check again when the current fetch is done
+            self.queued = True
+            return
+
+        # The feature source and request are created here on the main thread.  The task
+        # passes no result to on_finished when it returns None (cancelled), so 'result'
+        # defaults to None.
+        knownfids = self.datalayer.store.fid.copy()
+        source = QgsVectorLayerFeatureSource(self.maplayer)
+        self.task = QgsTask.fromFunction(
+            "Loading " + self.maplayer.name() + " in map extent",
+            self.loadRect,
+            source,
+            self.rectRequest(rect),
+            knownfids,
+            on_finished=lambda exception, result=None: self.fetched(
+                rect, exception, result
+            ),
+        )
+        QgsApplication.taskManager().addTask(self.task)
+
+    def fetched(self, rect, exception, result):
+        #
+        # Merge the features of a fetched region into the layer and update the layer state
+        # that depends on them (called on the main thread)
+        #
+        self.task = None
+        queued, self.queued = self.queued, False
+        if self.datalayer.extentloader is not self:  # The layer was reset
+            return
+        if exception is not None:
+            QgsMessageLog.logMessage(
+                "Failed to load map extent: " + str(exception), "QTDC", Qgis.Warning
+            )
+            if queued:
+                self.follow()
+            return
+        if result is None:  # Task was cancelled
+            return
+
+        store, unrendered = result
+        self.datalayer.noteRows(store, unrendered)
+        self.loaded.append(rect)
+        if len(store) > 0:
+            QgsMessageLog.logMessage(
+                "Loaded " + str(len(store)) + " features in map extent",
+                "QTDC",
+                Qgis.Info,
+            )
+            first = len(self.datalayer.store)
+            joined = TimeDataStore.join(
+                self.datalayer.store.elementclass, [self.datalayer.store, store]
+            )
+            joined.mergeSorted(first)
+            self.evict(joined)
+            self.datalayer.installStore(joined)
+            self.datalayer.layerExtend.emit(self.datalayer)
+        if queued:
+            self.follow()
+
+    def evict(self, store):
+        #
+        # Drop the rows of 'store' that lie beyond 'evictmargin' of the canvas extent (in the
+        # canvas CRS, as the store is).  The loaded regions are trimmed to the current request
+        # rectangle, which lies well inside the kept area, so regions that lost rows are
+        # fetched again when the map returns to them.
+        #
+        keeprect = self.datalayer.canvas.extent()
+        keeprect.grow(
+            ExtentLoader.evictmargin * max(keeprect.width(), keeprect.height())
+        )
+        xmin, ymin, xmax, ymax = SpatialGrid.bounds(store)
+        keep = (
+            (xmax >= keeprect.xMinimum())
+            & (xmin <= keeprect.xMaximum())
+            & (ymax >= keeprect.yMinimum())
+            & (ymin <= keeprect.yMaximum())
+        )
+        if keep.all():
+            return
+        store.select(np.flatnonzero(keep))
+        current = self.requestRect()
+        self.loaded = [
+            loaded.intersect(current)
+            for loaded in self.loaded
+            if loaded.intersects(current)
+        ]
+        QgsMessageLog.logMessage(
+            "Evicted " + str(len(keep) - len(store)) + " features far from map extent",
+            "QTDC",
+            Qgis.Info,
+        )
+
+    def cancel(self):
+        # Stop fetching (e.g. when the layer is reloaded or removed)
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
@@ -278,75 +278,24 @@ class HistogramWidget(QWidget):
         tmin += self.datalayer.timeshift
         tmax += self.datalayer.timeshift
 
-        bins = np.linspace(
-            tmin, tmax, w - 4
-        )  # The 4 pixel trim is to prevent the right/left borders from covering data
+        # Get the counts from the layer's shared histogram.  There is one bin per pixel,
+        # the 4 pixel trim is to prevent the right/left borders from covering data
+        y = self.datalayer.histogram.counts(tmin, tmax, w - 4).tolist()
 
         self.histo = []
         self.histoline = []
         self.gridlines = []
 
-        y = []
-
         QgsMessageLog.logMessage(
             "Histogram time range: " + str(tmax) + " : " + str(tmin), "QTDC", Qgis.Info
         )
 
-        if self.datalayer.isdurationlayer():
-            data = self.datalayer.getdurationindex()
-            for bin in bins:
-                item = np.argwhere((bin <= data[:, 1]) & (data[:, 0] <= bin))
-                # item = (np.nonzero((bin <= data[:,1]) & (data[:,0] <= bin)))
-                y.append(item.shape[0])
+        if len(y) > 0:
             self.histmax = int(max(y))
             if self.histmax > 0 and self.logscale:
                 self.histmax = math.log(
                     self.histmax + 1, 2
                 )  # add 1 to make small values more visible
-            QgsMessageLog.logMessage(
-                str(self.histmax) + " duration hist max", "QTDC", Qgis.Info
-            )
-            if self.histmax == 0:
-                # Short data sets can fall 'between the bars' on extremely long timelines and not show.
-                # If this data is in the timeline range, put it all on the nearest bar.
-                startdata = data[0, 0]
-                enddata = data[data.shape[0] - 1, 1]
-                bardata = np.argwhere(
-                    (enddata <= data[:, 1]) & (data[:, 0] >= startdata)
-                )
-                barindex = np.searchsorted(bins, startdata, side="left")
-                if (barindex > 0) and (barindex < len(y)):
-                    y[barindex] = bardata.shape[0]
-                    self.histmax = bardata.shape[0]
-                    if self.histmax > 0 and self.logscale:
-                        self.histmax = math.log(
-                            self.histmax + 1, 2
-                        )  # add 1 to make small values more visible
-                    QgsMessageLog.logMessage(
-                        str(self.histmax) + " SHORT duration hist max",
-                        "QTDC",
-                        Qgis.Info,
-                    )
-
-        else:
-            data = self.datalayer.gettimeindex()
-
-            if len(data) > 0:
-                QgsMessageLog.logMessage(
-                    str(len(bins))
-                    + " histogram bins across "
-                    + str(tmax - tmin)
-                    + " for "
-                    + str(len(data)),
-                    "QTDC",
-                    Qgis.Info,
-                )
-                y, x = np.histogram(data, bins)
-                self.histmax = int(max(y))
-                if self.histmax > 0 and self.logscale:
-                    self.histmax = math.log(
-                        self.histmax + 1, 2
-                    )  # add 1 to make small values more visible
 
         x = 3  # Offset first bar x position to avoid left border
 
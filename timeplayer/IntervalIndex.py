@@ -0,0 +1,122 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import numpy as np
+
+
+class IntervalIndex:
+    """Overlap and next-interval queries over start-ordered time intervals"""
+
+    #
+    # The intervals (start, end) must be ordered by start time, as the rows of a duration layer are.
+    # The index is augmented with the running maximum of the end times and with the maximum
+    # end time of each block of 'blocksize' rows:
+    #  - rows at or after searchsorted(starts, t1, 'right') start after the window end t1
+    #  - rows before searchsorted(runningmaxend, t0, 'left') all end before the window start t0
+    #  - between the two, only blocks whose maximum end reaches t0 need to be examined
+    # so a window query costs two binary searches plus a scan proportional to the blocks
+    # that hold matching intervals.  NaN end times never match.
+    #
+    # Coverage counts at a set of times (the duration histogram) use the starts and a sorted
+    # copy of the ends of the valid intervals: the number of intervals with start <= t <= end
+    # is the number starting at or before t less the number ending before t.
+    #
+    # An index of appended intervals can be built from the index of the ones before them
+    # ('base'), so only the augmentation of the new intervals is computed.
+    #
+
+    blocksize = 256
+
+    def __init__(self, starts, ends, base=None):
+        self.starts = starts
+        self.ends = ends
+        self.count = len(starts)
+        if base is not None and 0 < base.count < self.count:
+            done = base.count
+            tail = np.fmax.accumulate(ends[done:])
+            np.fmax(tail, base.runningmaxend[-1], out=tail)
+            self.runningmaxend = np.concatenate((base.runningmaxend, tail))
+            # The last block of the base may be partial, so it is reduced again
+            firstblock = done // IntervalIndex.blocksize
+            blockstart = firstblock * IntervalIndex.blocksize
+            self.blockmaxend = np.concatenate(
+                (
+                    base.blockmaxend[:firstblock],
+                    np.fmax.reduceat(
+                        ends,
+                        np.arange(blockstart, self.count, IntervalIndex.blocksize),
+                    ),
+                )
+            )
+        elif self.count > 0:
+            self.runningmaxend = np.fmax.accumulate(ends)
+            self.blockmaxend = np.fmax.reduceat(
+                ends, np.arange(0, self.count, IntervalIndex.blocksize)
+            )
+        else:
+            self.runningmaxend = np.empty(0, dtype=np.float64)
+            self.blockmaxend = np.empty(0, dtype=np.float64)
+        self.validstarts = None
+        self.sortedends = None
+
+    def bounds(self, t0, t1):
+        # Get the row range that can hold intervals overlapping [t0, t1]
+        first = np.searchsorted(self.runningmaxend, t0, side="left")
+        last = np.searchsorted(self.starts, t1, side="right")
+        return first, last
+
+    def overlapping(self, t0, t1):
+        #
+        # Get the rows (ascending) of all intervals with start <= t1 and end >= t0
+        #
+        first, last = self.bounds(t0, t1)
+        if first >= last:
+            return np.empty(0, dtype=np.int64)
+
+        size = IntervalIndex.blocksize
+        firstblock = first // size
+        lastblock = (last + size - 1) // size
+        blocks = (
+            np.flatnonzero(self.blockmaxend[firstblock:lastblock] >= t0) + firstblock
+        )
+        if len(blocks) == 0:
+            return np.empty(0, dtype=np.int64)
+
+        rows = (blocks[:, np.newaxis] * size + np.arange(size)).ravel()
+        rows = rows[(rows >= first) & (rows < last)]
+        return rows[self.ends[rows] >= t0]
+
+    def nexttime(self, t0, t1, forward=True):
+        #
+        # Get the time of the next data beyond the window [t0, t1] in the given direction:
+        # forward, the start of the first interval ending at or after t0 (or the end of the
+        # last interval if there is none); in reverse, the end of the last interval starting
+        # at or before t1 (or the start of the first interval if there is none).
+        #
+        first, last = self.bounds(t0, t1)
+        if forward:
+            if first < self.count:
+                return self.starts[first].item()
+            return self.ends[self.count - 1].item()
+        else:
+            if last > 0:
+                return self.ends[last - 1].item()
+            return self.starts[0].item()
+
+    def coverage(self, times):
+        #
+        # Get the number of intervals with start <= t <= end at each of the given times
+        #
+        if self.sortedends is None:
+            # Intervals ending before they start (or with NaN times) can never contain a time
+            valid = self.ends >= self.starts
+            self.validstarts = self.starts[valid]
+            self.sortedends = np.sort(self.ends[valid])
+        started = np.searchsorted(self.validstarts, times, side="right")
+        ended = np.searchsorted(self.sortedends, times, side="left")
+        return started - ended
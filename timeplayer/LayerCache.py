@@ -0,0 +1,141 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import json
+import os
+import os.path
+import shutil
+
+import numpy as np
+
+from qgis.core import Qgis, QgsMessageLog
+
+from .TimeDataStore import TimeDataStore
+
+
+class LayerCache:
+    """Persistent on-disk cache of the processed data of a time data layer"""
+
+    #
+    # The cache lives in a 'cache' directory next to the layer's saved settings, in a
+    # subdirectory named by the fingerprint of the source data
+    # (.QTDC/<hash>/cache/<fingerprint>).  Only the cache of the latest source data is kept.
+    # Each column of the layer's TimeDataStore is written as a .npy file, labels are
+    # written as a single NUL separated utf-8 block, and a meta.json file
+    # records the cache version, the key the data was built with and any layer state needed
+    # to restore it.  The meta file is written last, so a cache without one is incomplete.
+    #
+    # Columns are memory-mapped copy-on-write when restored, so later in-place updates
+    # (e.g. CRS transforms) never modify the cache files.
+    #
+
+    version = 1
+
+    def __init__(self, path):
+        self.path = path
+
+    def metafile(self):
+        return os.path.join(self.path, "meta.json")
+
+    def readmeta(self):
+        try:
+            with open(self.metafile(), "r") as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def load(self, key, store):
+        #
+        # Restore the store from the cache if it was built with the same key.
+        # Returns the saved layer state, or None if the cache cannot be used.
+        #
+        meta = self.readmeta()
+        if meta is None or meta.get("version") != LayerCache.version:
+            return None
+        if meta.get("key") != key:
+            QgsMessageLog.logMessage(
+                "Layer cache is out of date: " + self.path, "QTDC", Qgis.Info
+            )
+            return None
+
+        try:
+            rows = meta["rows"]
+            columns = {}
+            for name in TimeDataStore.columns:
+                columns[name] = np.load(
+                    os.path.join(self.path, name + ".npy"), mmap_mode="c"
+                )
+            labels = None
+            if meta["labels"]:
+                with open(os.path.join(self.path, "labels.bin"), "rb") as f:
+                    labellist = f.read().decode("utf-8").split("\x00")
+                if len(labellist) != rows:
+                    return None
+                labels = np.empty(rows, dtype=object)
+                labels[:] = labellist
+            if len(columns["epoch"]) != rows or len(columns["featureoffsets"]) != (
+                rows + 1 if store.hasvertices else 1
+            ):
+                return None
+        except Exception as e:
+            QgsMessageLog.logMessage(
+                "Unable to read layer cache " + self.path + ": " + str(e),
+                "QTDC",
+                Qgis.Warning,
+            )
+            return None
+
+        store.restore(columns, labels)
+        return meta["state"]
+
+    def save(self, key, store, state):
+        #
+        # Write the store's columns to the cache along with the key and layer state
+        #
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+            # Remove the meta file first so a partially written cache is never used
+            if os.path.exists(self.metafile()):
+                os.remove(self.metafile())
+
+            for name in TimeDataStore.columns:
+                np.save(
+                    os.path.join(self.path, name + ".npy"),
+                    np.asarray(getattr(store, name)),
+                )
+
+            haslabels = store.labels is not None
+            if haslabels:
+                with open(os.path.join(self.path, "labels.bin"), "wb") as f:
+                    f.write("\x00".join(store.labels.tolist()).encode("utf-8"))
+
+            meta = {
+                "version": LayerCache.version,
+                "key": key,
+                "rows": len(store),
+                "labels": haslabels,
+                "state": state,
+            }
+            with open(self.metafile(), "w") as f:
+                f.write(json.dumps(meta))
+
+            # Drop the caches of earlier versions of the source data
+            parent = os.path.dirname(os.path.abspath(self.path))
+            for name in os.listdir(parent):
+                other = os.path.join(parent, name)
+                if os.path.isdir(other) and not os.path.samefile(other, self.path):
+                    shutil.rmtree(other, ignore_errors=True)
+            return True
+        except Exception as e:
+            QgsMessageLog.logMessage(
+                "Unable to write layer cache " + self.path + ": " + str(e),
+                "QTDC",
+                Qgis.Warning,
+            )
+        return False
@@ -0,0 +1,75 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LayerHistogram:
+    """Histogram counts of a time data layer, shared by its timeline widgets and the API"""
+
+    #
+    # Each TimeDataLayer owns one LayerHistogram.  Counts are computed once for a given time
+    # range and bin count and kept in a small cache, so the detail timeline (HistogramWidget),
+    # the overview timeline (HistoLineWidget) and API consumers asking for the same range
+    # share the work.  Cached counts are dropped when the layer's data store changes.
+    #
+    # For layers with a single time the counts are those of np.histogram over 'count' bin
+    # edges spaced evenly from tmin to tmax (count - 1 bins).  For duration layers the counts
+    # are the number of durations containing each of the 'count' times.
+    #
+
+    cachesize = 8
+
+    def __init__(self, datalayer):
+        self.datalayer = datalayer
+        self.cache = OrderedDict()
+
+    def counts(self, tmin, tmax, count):
+        #
+        # Get the histogram counts for the time range as a NumPy array
+        #
+        store = self.datalayer.store
+        key = (tmin, tmax, count, store.revision, self.datalayer.isdurationlayer())
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            return result
+
+        bins = np.linspace(tmin, tmax, count)
+        if self.datalayer.isdurationlayer():
+            result = self.durationcounts(bins)
+        elif len(store) > 0:
+            result = self.datalayer.gettimecounts(bins)
+        else:
+            result = np.zeros(0, dtype=np.int64)
+
+        result.flags.writeable = False
+        self.cache[key] = result
+        if len(self.cache) > LayerHistogram.cachesize:
+            self.cache.popitem(last=False)
+        return result
+
+    def durationcounts(self, bins):
+        # Count the durations containing each bin time in one pass
+        y = self.datalayer.getdurationcounts(bins)
+        if len(y) > 0 and y.max() == 0:
+            # Short data sets can fall 'between the bars' on extremely long timelines and not show.
+            # If this data is in the timeline range, put it all on the nearest bar.
+            data = self.datalayer.getdurationindex()
+            startdata = data[0, 0]
+            enddata = data[data.shape[0] - 1, 1]
+            bardata = np.argwhere((enddata <= data[:, 1]) & (data[:, 0] >= startdata))
+            barindex = np.searchsorted(bins, startdata, side="left")
+            if (barindex > 0) and (barindex < len(y)):
+                y[barindex] = bardata.shape[0]
+        return y
+
+    def clear(self):
+        self.cache.clear()
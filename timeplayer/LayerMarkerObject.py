@@ -15,6 +15,7 @@ from qgis.PyQt.QtCore import QObject
 class markerObject(QObject):
     def __init__(self):
         self.markerImage = None
+        self.fadePixmaps = {}  # markerImage rendered to a pixmap at each opacity drawn
         self.paintxform = None
         self.color = None
         self.pen = None
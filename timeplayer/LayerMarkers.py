@@ -258,9 +258,10 @@ class LayerMarkers:
             QgsApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
 
     def addRandomMarker(self, strvalue):
+        # Features may be staged by several tasks at once (tiles, extents, partitions), so the
+        # marker is only added if no other task added one for the value first
         tableindex = int(random.random() * 359)
-        self.attrdict[strvalue] = tableindex
-        return tableindex
+        return self.attrdict.setdefault(strvalue, tableindex)
 
     def getcategorizedsymbols(self, renderer):
 
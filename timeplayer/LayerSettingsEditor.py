@@ -169,7 +169,7 @@ class LayerSettingsEditor:
         if self.hispeed:
             if self.messageBar:
                 self.messageBar.pushMessage(
-                    "Cached rendering has been activated.  EXPECT DELAYS with map redraw/resizing events.",
+                    "Cached rendering has been activated.",
                     level=Qgis.Info,
                     duration=5,
                 )
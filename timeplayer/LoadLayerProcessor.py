@@ -19,12 +19,21 @@ from qgis.PyQt.QtWidgets import QDialog, QColorDialog, QDialogButtonBox
 from datetime import datetime, timezone
 from dateutil.parser import parse
 
-from qgis.core import Qgis, QgsMessageLog, QgsExpression, QgsApplication
+from qgis.core import (
+    Qgis,
+    QgsMessageLog,
+    QgsExpression,
+    QgsApplication,
+    QgsFeatureRequest,
+    QgsVectorDataProvider,
+)
 
 from .LoadLayerState import LoadLayerState
 from .LoadLayer import Ui_LoadLayerDialog
 from .TimeDataLayer import TimeDataLayer
 from .SavedSettingsDialog import Ui_savedSettingsDialog
+from .SourceFingerprint import SourceFingerprint
+from .BulkTimeParser import bulkTimeParser
 
 
 class LoadLayerProcessor:
@@ -40,6 +49,12 @@ class LoadLayerProcessor:
     baseTimeMicros = 3124224000000  # epoch milliseconds for 1-Jan-2069.
     # If time sample value exceeds this, assume microseconds
 
+    # Time format detection checks this many values, taken evenly from the feature ids of
+    # the whole layer, or from its first sampleScanLimit features if the provider can't
+    # fetch features by id
+    sampleSize = 1000
+    sampleScanLimit = 200000
+
     def __init__(self, canvas):
         super(LoadLayerProcessor, self).__init__()
 
@@ -60,6 +75,8 @@ class LoadLayerProcessor:
         )
 
         self.firstfeature = None
+        self.samples = {}  # Sampled values of each time field, for format detection
+        self.samplescope = {}  # Description of the rows each field was sampled from
         self.maplayer = None
         self.dolabels = None
         self.breakout = self.loadlayerUI.attributecolorCheckBox.isChecked()
@@ -102,6 +119,8 @@ class LoadLayerProcessor:
             for feature in layerfeatures:
                 self.firstfeature = feature
                 break
+            self.samples = {}
+            self.samplescope = {}
 
             self.loadlayerUI.timeattributeBox.setLayer(maplayer)
             self.loadlayerUI.endTimeAttributeBox.setLayer(maplayer)
@@ -182,7 +201,11 @@ class LoadLayerProcessor:
                 # Save layer settings!
                 QgsMessageLog.logMessage(self.loadstate.asString(), "QTDC", Qgis.Info)
                 # Write layer state file
-                self.saveSettingsFile(maplayer)
+                settingsPath = self.saveSettingsFile(maplayer)
+                # The ingest cache is kept per version of the source data
+                self.loadstate.cachepath = os.path.join(
+                    settingsPath, "cache", SourceFingerprint(maplayer).hexdigest()
+                )
                 return self.loadstate, preApproved
 
         except:
@@ -445,6 +468,9 @@ class LoadLayerProcessor:
                 timestring = ""
                 dateFmt = self.extractSample(epochvalue)
                 if not dateFmt is None:
+                    dateFmt, samplecount, slowcount, failcount = self.selectParser(
+                        fieldname, dateFmt
+                    )
                     self.loadstate.dateFormatter = dateFmt
                     secs = dateFmt.parseDate(epochvalue)
                     if secs is None:
@@ -454,6 +480,9 @@ class LoadLayerProcessor:
                         timestring = time.strftime(
                             "%Y-%m-%d %H:%M:%S", time.gmtime(int(secs))
                         )
+                        timestring += self.sampleReport(
+                            fieldname, samplecount, slowcount, failcount
+                        )
                 else:
                     QgsMessageLog.logMessage(
                         "Failed to get date parser.", "QTDC", Qgis.Info
@@ -467,6 +496,152 @@ class LoadLayerProcessor:
             return True
         return False
 
+    def sampleValues(self, fieldname):
+        #
+        # Get (and keep) up to sampleSize non-null values of a field, spread evenly over
+        # the layer so files sorted by time or changing format partway through are
+        # sampled throughout.  Features are fetched by evenly spaced ids when the provider
+        # supports it and the ids are mostly contiguous, otherwise the values are taken
+        # from the first sampleScanLimit features.
+        #
+        values = self.samples.get(fieldname)
+        if values is not None:
+            return values
+
+        values = self.spreadValues(fieldname)
+        if values is not None:
+            self.samples[fieldname] = values
+            self.samplescope[fieldname] = (
+                "across all " + str(self.maplayer.featureCount()) + " rows"
+            )
+            return values
+
+        scancount = min(
+            self.maplayer.featureCount(), LoadLayerProcessor.sampleScanLimit
+        )
+        stride = max(1, scancount // LoadLayerProcessor.sampleSize)
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([fieldname], self.maplayer.fields())
+        request.setLimit(LoadLayerProcessor.sampleScanLimit)
+
+        values = []
+        for i, feature in enumerate(self.maplayer.getFeatures(request)):
+            if i % stride == 0:
+                value = feature[fieldname]
+                if value is None or (isinstance(value, QVariant) and value.isNull()):
+                    continue
+                values.append(value)
+                if len(values) >= LoadLayerProcessor.sampleSize:
+                    break
+        self.samples[fieldname] = values
+        self.samplescope[fieldname] = "from the first " + str(scancount) + " rows"
+        return values
+
+    def spreadValues(self, fieldname):
+        #
+        # Get the non-null values of a field for sampleSize feature ids spaced evenly from
+        # the first feature's id over the feature count.  Returns None if the provider
+        # can't fetch features by id or too few of the ids exist (e.g. sparse ids).
+        #
+        provider = self.maplayer.dataProvider()
+        if self.firstfeature is None or not (
+            provider.capabilities() & QgsVectorDataProvider.SelectAtId
+        ):
+            return None
+        count = self.maplayer.featureCount()
+        if count <= LoadLayerProcessor.sampleSize:
+            return None  # The head scan reads every feature anyway
+        first = self.firstfeature.id()
+        step = count / LoadLayerProcessor.sampleSize
+        fids = [first + int(i * step) for i in range(LoadLayerProcessor.sampleSize)]
+        request = QgsFeatureRequest()
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes([fieldname], self.maplayer.fields())
+        request.setFilterFids(fids)
+
+        found = 0
+        values = []
+        for feature in self.maplayer.getFeatures(request):
+            found += 1
+            value = feature[fieldname]
+            if value is None or (isinstance(value, QVariant) and value.isNull()):
+                continue
+            values.append(value)
+        if found < len(fids) // 2:
+            return None
+        return values
+
+    def selectParser(self, fieldname, dateFmt):
+        #
+        # Check the parser chosen from the first feature against a sample of the field.
+        # For date strings, the fixed layout parsers that read times in the same time zone
+        # as the chosen parser (UTC for Manual and IsoFormat, local time for StrpTime and
+        # DateString) are tried, and the first that parses every sampled value is used.
+        # Otherwise the chosen parser is kept and the rows it cannot parse are dropped.
+        # Returns the parser, the sample size and the number of sampled values that need the
+        # parser's slow (per value) path or fail to parse.
+        #
+        values = self.sampleValues(fieldname)
+        if len(values) == 0:
+            return dateFmt, 0, 0, 0
+
+        if isinstance(dateFmt, (Manual, IsoFormat)):
+            candidates = [Manual(), IsoFormat()]
+        elif isinstance(dateFmt, (StrpTime, DateString)):
+            candidates = [StrpTime()]
+        else:
+            candidates = [dateFmt]
+
+        for candidate in candidates:
+            times, ok, slowcount = bulkTimeParser.parse(candidate, values)
+            if ok.all():
+                QgsMessageLog.logMessage(
+                    type(candidate).__name__
+                    + " date parser handles "
+                    + str(len(values))
+                    + " sampled values, "
+                    + str(slowcount)
+                    + " parsed individually.",
+                    "QTDC",
+                    Qgis.Info,
+                )
+                return candidate, len(values), slowcount, 0
+
+        # No parser handles every sampled value: keep the parser for the first feature
+        times, ok, slowcount = bulkTimeParser.parse(dateFmt, values)
+        failcount = len(values) - int(ok.sum())
+        QgsMessageLog.logMessage(
+            type(dateFmt).__name__
+            + " date parser fails on "
+            + str(failcount)
+            + " of "
+            + str(len(values))
+            + " sampled values.",
+            "QTDC",
+            Qgis.Info,
+        )
+        return dateFmt, len(values), slowcount - failcount, failcount
+
+    def sampleReport(self, fieldname, samplecount, slowcount, failcount):
+        #
+        # Describe the sampled values of a field that need the slow parser or fail, and the
+        # rows they were sampled from (see sampleValues)
+        #
+        if samplecount == 0 or (slowcount == 0 and failcount == 0):
+            return ""
+        report = "  (" + str(slowcount) + " slow"
+        if failcount > 0:
+            report += ", " + str(failcount) + " bad"
+        return (
+            report
+            + " of "
+            + str(samplecount)
+            + " values sampled "
+            + self.samplescope.get(fieldname, "")
+            + ")"
+        )
+
     def setcontinue(self, cont):
         QgsMessageLog.logMessage("SetContinue: " + str(cont), "QTDC", Qgis.Info)
         self.loadlayerUI.buttonBox.button(QDialogButtonBox.Ok).setEnabled(cont)
@@ -494,6 +669,7 @@ class LoadLayerProcessor:
         with open(file, "w") as f:
             f.write(self.loadstate.asJson())
             f.close()
+        return path
 
     def lookupSettingsFile(self, maplayer):
         hashValue = self.getMapLayerHash(maplayer)
@@ -505,9 +681,24 @@ class LoadLayerProcessor:
         if os.path.exists(path):
             return path
 
+        # Fall back to settings saved under the previous layer hashes
+        for hashValue in (
+            SourceFingerprint(maplayer).hexdigest(),
+            self.getLegacyMapLayerHash(maplayer),
+        ):
+            path = os.path.join(
+                QgsApplication.qgisSettingsDirPath(), ".QTDC", hashValue
+            )
+            if os.path.exists(os.path.join(path, "settings.json")):
+                return path
+
         return None
 
     def getMapLayerHash(self, maplayer):
+        # Identify the layer by its source (provider and URI), so settings survive data changes
+        return SourceFingerprint(maplayer).identity()
+
+    def getLegacyMapLayerHash(self, maplayer):
         m = hashlib.sha256()
         m.update(maplayer.name().encode())
         m.update(str(len(maplayer.fields())).encode())
@@ -544,6 +735,22 @@ class StrpTime:
             d = datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
         return d.timestamp()
 
+    # parse 'YYYY-MM-DD HH:MM:SS[.ffffff]' local times in bulk
+    def parseDates(self, values):
+        codes, lengths = bulkTimeParser.codepoints(values)
+        seconds, valid = bulkTimeParser.fixedfields(codes)
+        valid &= bulkTimeParser.characters(codes, [4, 7], "-")
+        valid &= bulkTimeParser.characters(codes, [10], " ")
+        valid &= bulkTimeParser.characters(codes, [13, 16], ":")
+        micro, fraction = bulkTimeParser.fraction(codes, lengths, 20, pad=True)
+        fraction &= bulkTimeParser.characters(codes, [19], ".")
+        valid &= (lengths == 19) | fraction
+        return bulkTimeParser.localTimes(seconds, micro, valid)
+
+    # expression literal for comparing field values with a time (see TimeTilePager)
+    def literal(self, secs):
+        return "'" + datetime.fromtimestamp(secs).strftime("%Y-%m-%d %H:%M:%S") + "'"
+
 
 class IsoFormat:
     def parseDate(self, s):
@@ -553,6 +760,23 @@ class IsoFormat:
             .timestamp()
         )
 
+    # parse 'YYYY-MM-DDTHH:MM:SS.ffffffZ' times in bulk
+    def parseDates(self, values):
+        codes, lengths = bulkTimeParser.codepoints(values)
+        seconds, valid = bulkTimeParser.fixedfields(codes)
+        valid &= bulkTimeParser.characters(codes, [4, 7], "-")
+        valid &= bulkTimeParser.characters(codes, [10], "T")
+        valid &= bulkTimeParser.characters(codes, [13, 16], ":")
+        valid &= bulkTimeParser.characters(codes, [19], ".")
+        valid &= bulkTimeParser.lastcharacter(codes, lengths, "Z")
+        micro, fraction = bulkTimeParser.fraction(codes, lengths - 1, 20, pad=True)
+        return bulkTimeParser.utcTimes(seconds, micro, valid & fraction)
+
+    # expression literal for comparing field values with a time (see TimeTilePager)
+    def literal(self, secs):
+        d = datetime.fromtimestamp(secs, timezone.utc)
+        return "'" + d.strftime("%Y-%m-%dT%H:%M:%S") + "'"
+
 
 ##
 
@@ -597,6 +821,26 @@ class Manual:
             )
         return dtod.timestamp()
 
+    # parse the same layout in bulk; rows with signs or spaces in the numbers are left to parseDate
+    def parseDates(self, values):
+        codes, lengths = bulkTimeParser.codepoints(values)
+        seconds, valid = bulkTimeParser.fixedfields(codes)
+        dots = (codes == ord(".")).sum(axis=1)
+        nodot = dots == 0
+        onedot = (dots == 1) & bulkTimeParser.characters(codes, [19], ".")
+
+        # Fractions shorter than 6 digits are read as a count of microseconds,
+        # longer fractions are truncated to their first 6 digits
+        micro, short = bulkTimeParser.fraction(codes, lengths, 20, pad=False)
+        first6, first6digits = bulkTimeParser.number(codes, 20, 6)
+        longrows = lengths >= 26
+        micro[longrows] = first6[longrows]
+        short[longrows] = first6digits[longrows]
+        micro[nodot] = 0
+
+        valid &= nodot | (onedot & short)
+        return bulkTimeParser.utcTimes(seconds, micro, valid)
+
 
 class EpochSec:
     """
@@ -610,6 +854,12 @@ class EpochSec:
     def parseDate(self, s):
         return float(s)
 
+    def parseDates(self, values):
+        return bulkTimeParser.numbers(values, 1)
+
+    def literal(self, secs):
+        return repr(float(secs))
+
 
 ##
 class DateTimeParser:
@@ -637,6 +887,12 @@ class EpochMSec:
     def parseDate(self, s):
         return float(s) / 1000
 
+    def parseDates(self, values):
+        return bulkTimeParser.numbers(values, 1000)
+
+    def literal(self, secs):
+        return repr(float(secs * 1000))
+
 
 class Epoch_uSec:
     """
@@ -650,5 +906,11 @@ class Epoch_uSec:
     def parseDate(self, s):
         return float(s) / 1000000
 
+    def parseDates(self, values):
+        return bulkTimeParser.numbers(values, 1000000)
+
+    def literal(self, secs):
+        return repr(float(secs * 1000000))
+
 
 ##################################################
@@ -21,6 +21,10 @@ class LoadLayerState:
         self.durationfield = None
         self.colorattr = ""
         self.timecrtfield = ""
+        self.cachepath = None  # Directory of the layer's ingest cache (not saved with the settings)
+        self.pagesize = None  # Seconds per time tile when paging the layer, None loads it all
+        self.pagebudget = 512  # Megabytes of tiles kept loaded when paging
+        self.followextent = False  # Load only the features in the map extent
         pass
 
     def asString(self):
@@ -33,6 +37,8 @@ class LoadLayerState:
             result = result + "Label: " + str(self.labelExpression) + "\n"
         result = result + "Color attr: " + str(self.colorattr) + "\n"
         result = result + "Load selected: " + str(self.selectedonly) + "\n"
+        result = result + "Page size: " + str(self.pagesize) + "\n"
+        result = result + "Follow extent: " + str(self.followextent) + "\n"
         return result
 
     def asJson(self):
@@ -46,6 +52,9 @@ class LoadLayerState:
                 else self.labelExpression.expression(),
                 "color_attribute": self.colorattr,
                 "load_selected_only": self.selectedonly,
+                "page_size": self.pagesize,
+                "page_budget": self.pagebudget,
+                "follow_extent": self.followextent,
             }
         )
 
@@ -57,4 +66,7 @@ class LoadLayerState:
         self.labelExpression = QgsExpression(jsonObj["label_expression"])
         self.colorattr = jsonObj["color_attribute"]
         self.selectedonly = jsonObj["load_selected_only"]
+        self.pagesize = jsonObj.get("page_size")
+        self.pagebudget = jsonObj.get("page_budget", 512)
+        self.followextent = jsonObj.get("follow_extent", False)
         return
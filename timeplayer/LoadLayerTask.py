@@ -10,6 +10,7 @@ import random
 from time import sleep
 
 from qgis.PyQt.QtWidgets import QMessageBox
+from qgis.PyQt.QtCore import pyqtSignal, pyqtSlot
 
 from qgis.core import (
     Qgis,
@@ -24,15 +25,21 @@ MESSAGE_CATEGORY = "QTDC"
 class LoadLayerTask(QgsTask):
     """QgsTask for loading a layer into the TDC"""
 
+    # Emitted from the task thread with data for the layer (see publishStore)
+    storeReady = pyqtSignal(object, bool)
+
     def __init__(self, description, maplayer, destlayer, callback):
         super().__init__(description, QgsTask.CanCancel)
 
         self.setProgress(0)
         self.exception = None
+        self.published = False  # True once partial data has been handed to the callback
+        self.storeReady.connect(self.installStore)
 
         self.maplayer = maplayer
         self.callback = callback
         self.timedatalayer = destlayer
+        destlayer.prepareLoad(maplayer)  # Created on the main thread
 
     def run(self):
         """
@@ -49,6 +56,34 @@ class LoadLayerTask(QgsTask):
             self.exception = e
         return success
 
+    def publishStore(self, store, final):
+        """
+        Pass loaded data to the main thread.  Called from the task thread with a time ordered
+        TimeDataStore, either partial data while the load continues or the final data.
+        """
+        self.storeReady.emit(store, final)
+
+    @pyqtSlot(object, bool)
+    def installStore(self, store, final):
+        """
+        Install published data in the layer on the main thread.  The first partial data is
+        handed to the 'callback' so the layer can be shown and animated while loading, later
+        partial data only extends the layer (see TimeDataLayer.LayerExtend) so the play
+        window is left alone.  The final data is announced as a layer update when the task
+        finishes.
+        """
+        if self.timedatalayer is None:
+            return
+        self.timedatalayer.installStore(store)
+        if final:
+            return
+        if not self.published:
+            self.published = True
+            self.timedatalayer.success = True
+            self.callback(self.timedatalayer)
+        else:
+            self.timedatalayer.layerExtend.emit(self.timedatalayer)
+
     def finished(self, result):
         """
         On task completion, call the 'callback' with the loaded layer if successful.
@@ -59,7 +94,10 @@ class LoadLayerTask(QgsTask):
                 'Task "{name}" completed\n'.format(name=self.description()),
                 MESSAGE_CATEGORY,
             )
-            self.callback(self.timedatalayer)
+            if self.published:
+                self.timedatalayer.layerUpdate.emit(self.timedatalayer)
+            else:
+                self.callback(self.timedatalayer)
         else:
             if self.exception is None:
                 self.timedatalayer.setLoading(True, "Canceled.", True)
@@ -0,0 +1,117 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import hashlib
+import os
+import os.path
+
+from qgis.core import QgsFeatureRequest, QgsProviderRegistry
+
+
+class SourceFingerprint:
+    """A cheap content-based fingerprint of the data behind a map layer"""
+
+    #
+    # The fingerprint identifies the data a layer was loaded from without scanning it.
+    # It combines the provider and its URI, the fields and feature count, the size and
+    # modification time of the source file (or the provider's data timestamp when the
+    # source is not a file), and a digest of sampled content: blocks read from the
+    # start, middle and end of the file plus the first few features of the layer.
+    #
+
+    sampleFeatures = 64  # Number of features hashed from the start of the layer
+    sampleBlock = 65536  # Bytes read at each file sample position
+
+    def __init__(self, maplayer):
+        self.maplayer = maplayer
+        self.path = self.sourcePath()
+
+    def sourcePath(self):
+        # Get the path of the file behind the layer, or None if it is not file based
+        try:
+            parts = QgsProviderRegistry.instance().decodeUri(
+                self.maplayer.providerType(), self.maplayer.source()
+            )
+            path = parts.get("path")
+            if path and os.path.isfile(path):
+                return path
+        except Exception:
+            pass
+        return None
+
+    def identity(self):
+        #
+        # Digest of the identity of the source alone (provider and URI), which stays the same
+        # when the data changes.  Saved layer settings are kept under it.
+        #
+        m = hashlib.sha256()
+        provider = self.maplayer.dataProvider()
+        for value in (
+            self.maplayer.providerType(),
+            provider.dataSourceUri() if provider else self.maplayer.source(),
+        ):
+            m.update(str(value).encode())
+            m.update(b"\x00")
+        return m.hexdigest()
+
+    def tracksChanges(self):
+        #
+        # Does the fingerprint change whenever the data does?  Only when the source is a file
+        # or the provider reports a data timestamp; database providers usually do not, and
+        # edits past the sampled features would go unnoticed.
+        #
+        if self.path:
+            return True
+        provider = self.maplayer.dataProvider()
+        return provider is not None and provider.dataTimestamp().isValid()
+
+    def hexdigest(self):
+        m = hashlib.sha256()
+
+        def add(value):
+            m.update(str(value).encode())
+            m.update(b"\x00")
+
+        provider = self.maplayer.dataProvider()
+        add(self.maplayer.providerType())
+        add(provider.dataSourceUri() if provider else self.maplayer.source())
+        add(self.maplayer.subsetString())
+        add(self.maplayer.featureCount())
+        for field in self.maplayer.fields():
+            add(field.name())
+            add(field.typeName())
+
+        if self.path:
+            stat = os.stat(self.path)
+            add(stat.st_size)
+            add(stat.st_mtime_ns)
+            self.addFileSample(m, stat.st_size)
+        elif provider:
+            timestamp = provider.dataTimestamp()
+            if timestamp.isValid():
+                add(timestamp.toMSecsSinceEpoch())
+
+        self.addFeatureSample(m)
+        return m.hexdigest()
+
+    def addFileSample(self, m, size):
+        # Hash blocks from the start, middle and end of the source file
+        block = SourceFingerprint.sampleBlock
+        with open(self.path, "rb") as f:
+            offsets = {0, max(0, size // 2 - block // 2), max(0, size - block)}
+            for offset in sorted(offsets):
+                f.seek(offset)
+                m.update(f.read(block))
+
+    def addFeatureSample(self, m):
+        # Hash the geometry and attributes of the first few features
+        request = QgsFeatureRequest().setLimit(SourceFingerprint.sampleFeatures)
+        for feature in self.maplayer.getFeatures(request):
+            m.update(str(feature.id()).encode())
+            m.update(bytes(feature.geometry().asWkb()))
+            m.update(str(feature.attributes()).encode())
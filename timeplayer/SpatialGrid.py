@@ -0,0 +1,199 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import numpy as np
+
+
+class SpatialGrid:
+    """Spatial index of the rows of a TimeDataStore for culling rows outside the map view"""
+
+    #
+    # Each row's bounding box is kept in four arrays.  Rows whose box fits in a grid cell are
+    # filed under the cell holding the box's lower left corner, so a row can only meet a view
+    # rectangle if its cell is in the rectangle's cells or one cell below or left of them.
+    # The rows of each cell are kept in row (time) order, so the rows of a cell inside a time
+    # window are found by a binary search.  Rows larger than a cell are few and are tested by
+    # their bounding box.
+    #
+    # The index reflects the store at one revision; the layer builds a new one when the store
+    # changes (see TimeDataLayer.visibleRows), or extends it over rows appended after the
+    # indexed ones (see TimeDataLayer.mergepoints).  Appended rows are filed in the existing
+    # cells, those outside the grid in its edge cells, which the clipped cells of a query
+    # rectangle still reach.  Once the rows have doubled the grid is rebuilt on the next query.
+    #
+
+    rowsPerCell = 64  # Average rows per cell the grid is sized for
+    maxCells = 1024  # Cells along each axis at most
+
+    def __init__(self, store):
+        self.store = store
+        self.revision = store.revision
+        self.xmin, self.ymin, self.xmax, self.ymax = SpatialGrid.bounds(store)
+        self.keys = None  # Built on first use by buildIndex
+        self.indexedcount = 0  # Rows when the index was built
+
+    @staticmethod
+    def bounds(store, first=0):
+        #
+        # Get the bounding box arrays of the rows of a store from 'first' onward (NaN for rows
+        # without coordinates)
+        #
+        if not store.hasvertices:
+            return store.x[first:], store.y[first:], store.x[first:], store.y[first:]
+        count = len(store) - first
+        if count == 0 or len(store.coords) == 0:
+            empty = np.full(count, np.nan)
+            return empty, empty, empty, empty
+        # Every row has at least one vertex, so its vertices start at a distinct offset
+        starts = store.partoffsets[store.featureoffsets[first:-1]]
+        xs = store.coords[:, 0]
+        ys = store.coords[:, 1]
+        return (
+            np.fmin.reduceat(xs, starts),
+            np.fmin.reduceat(ys, starts),
+            np.fmax.reduceat(xs, starts),
+            np.fmax.reduceat(ys, starts),
+        )
+
+    def buildIndex(self):
+        #
+        # Build the grid over the extent of the rows
+        #
+        rowcount = len(self.xmin)
+        self.indexedcount = rowcount
+        valid = np.isfinite(self.xmin) & np.isfinite(self.ymin)
+        valid &= np.isfinite(self.xmax) & np.isfinite(self.ymax)
+        if not valid.any():
+            self.origin = (0.0, 0.0)
+            self.cellsize = (1.0, 1.0)
+            self.shape = (1, 1)
+            self.keys = np.empty(0, dtype=np.int64)
+            self.cellrows = np.empty(0, dtype=np.int64)
+            self.largerows = np.empty(0, dtype=np.int64)
+            return
+
+        x0 = self.xmin[valid].min()
+        y0 = self.ymin[valid].min()
+        width = max(self.xmax[valid].max() - x0, 1e-9)
+        height = max(self.ymax[valid].max() - y0, 1e-9)
+        cells = np.sqrt(valid.sum() / SpatialGrid.rowsPerCell)
+        cells = int(np.clip(cells, 1, SpatialGrid.maxCells))
+        self.origin = (x0, y0)
+        self.cellsize = (width / cells, height / cells)
+        self.shape = (cells, cells)
+
+        large = valid & (
+            (self.xmax - self.xmin > self.cellsize[0])
+            | (self.ymax - self.ymin > self.cellsize[1])
+        )
+        small = np.flatnonzero(valid & ~large)
+        ix, iy = self.cellof(self.xmin[small], self.ymin[small])
+        # Keys combine the cell and the row, so sorting them groups rows by cell in time order
+        keys = (iy * cells + ix) * rowcount + small
+        order = np.argsort(keys, kind="stable")
+        self.keys = keys[order]
+        self.cellrows = small[order]
+        self.largerows = np.flatnonzero(large)
+
+    def extend(self, first):
+        #
+        # Add the rows the store appended from 'first' onward (first > 0) to the index
+        #
+        store = self.store
+        if store.hasvertices:
+            self.xmin, self.ymin, self.xmax, self.ymax = (
+                np.concatenate((indexed[:first], appended))
+                for indexed, appended in zip(
+                    (self.xmin, self.ymin, self.xmax, self.ymax),
+                    SpatialGrid.bounds(store, first),
+                )
+            )
+        else:
+            self.xmin, self.ymin, self.xmax, self.ymax = SpatialGrid.bounds(store)
+        self.revision = store.revision
+        rowcount = len(self.xmin)
+        if self.keys is None or rowcount > 2 * self.indexedcount:
+            self.keys = None
+            return
+
+        rows = np.arange(first, rowcount)
+        xmin = self.xmin[first:]
+        ymin = self.ymin[first:]
+        xmax = self.xmax[first:]
+        ymax = self.ymax[first:]
+        valid = np.isfinite(xmin) & np.isfinite(ymin)
+        valid &= np.isfinite(xmax) & np.isfinite(ymax)
+        large = valid & (
+            (xmax - xmin > self.cellsize[0]) | (ymax - ymin > self.cellsize[1])
+        )
+        small = rows[valid & ~large]
+        ix, iy = self.cellof(self.xmin[small], self.ymin[small])
+        keys = (iy * self.shape[0] + ix) * rowcount + small
+        order = np.argsort(keys, kind="stable")
+        # The indexed rows keep their order under the new row count, and the appended rows
+        # follow them in each cell
+        indexed = (self.keys // first) * rowcount + self.cellrows
+        positions = np.searchsorted(indexed, keys[order])
+        self.keys = np.insert(indexed, positions, keys[order])
+        self.cellrows = np.insert(self.cellrows, positions, small[order])
+        self.largerows = np.concatenate((self.largerows, rows[large]))
+
+    def cellof(self, x, y):
+        # Grid column and row of map coordinates (clipped to the grid)
+        ix = np.floor((x - self.origin[0]) / self.cellsize[0]).astype(np.int64)
+        iy = np.floor((y - self.origin[1]) / self.cellsize[1]).astype(np.int64)
+        return (
+            np.clip(ix, 0, self.shape[0] - 1),
+            np.clip(iy, 0, self.shape[1] - 1),
+        )
+
+    def meets(self, rows, rect):
+        # Mask of the rows whose bounding box meets rect (xmin, ymin, xmax, ymax)
+        return (
+            (self.xmax[rows] >= rect[0])
+            & (self.xmin[rows] <= rect[2])
+            & (self.ymax[rows] >= rect[1])
+            & (self.ymin[rows] <= rect[3])
+        )
+
+    def query(self, start, end, rect):
+        #
+        # Get the rows in [start, end) whose bounding box meets rect, in ascending order.
+        # Returns None if the rectangle covers so many cells that testing the rows directly
+        # is cheaper.
+        #
+        if self.keys is None:
+            self.buildIndex()
+        rowcount = len(self.xmin)
+        cells = self.shape[0]
+        ix0, iy0 = self.cellof(np.array([rect[0]]), np.array([rect[1]]))
+        ix1, iy1 = self.cellof(np.array([rect[2]]), np.array([rect[3]]))
+        ix0 = max(int(ix0[0]) - 1, 0)
+        iy0 = max(int(iy0[0]) - 1, 0)
+        ix1 = int(ix1[0])
+        iy1 = int(iy1[0])
+        cellcount = (ix1 - ix0 + 1) * (iy1 - iy0 + 1)
+        if cellcount * SpatialGrid.rowsPerCell > (end - start):
+            return None
+
+        # The rows of each cell in the time range lie between two keys
+        columns = np.arange(ix0, ix1 + 1)
+        cellids = (np.arange(iy0, iy1 + 1)[:, None] * cells + columns).ravel()
+        lo = np.searchsorted(self.keys, cellids * rowcount + start)
+        hi = np.searchsorted(self.keys, cellids * rowcount + end)
+        lengths = hi - lo
+        index = np.arange(lengths.sum()) + np.repeat(
+            lo - np.cumsum(lengths) + lengths, lengths
+        )
+        candidates = self.cellrows[index]
+
+        large = self.largerows[
+            np.searchsorted(self.largerows, start) : np.searchsorted(self.largerows, end)
+        ]
+        candidates = np.concatenate((candidates, large))
+        return np.sort(candidates[self.meets(candidates, rect)])
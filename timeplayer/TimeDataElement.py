@@ -6,20 +6,100 @@
 # (c) 2021 The MITRE Corporation
 #
 
+import math
+
 from qgis.core import *
 from qgis.PyQt import QtCore
+from qgis.PyQt.QtGui import QFont
+
+from .CoordinateArrays import coordinateArrays
 
 
 class TimeDataElement(object):
-    def __init__(self, epoch, endepoch=None):
-        self._epoch = epoch
-        if endepoch:
-            self._endepoch = endepoch
+    #
+    # A time data element is a lightweight view of a single row of a TimeDataStore.
+    # Elements are created on demand and hold no feature data of their own.
+    #
+
+    # Line and polygon elements keep their vertices in the store's ragged vertex buffer
+    hasvertices = False
+
+    def __init__(self, store, index):
+        self._store = store
+        self._index = index
 
     @property
     def epoch(self):
-        return self._epoch
+        return self._store.epoch[self._index].item()
 
     @property
     def endepoch(self):
-        return self._endepoch
+        endepoch = self._store.endepoch[self._index].item()
+        if math.isnan(endepoch):
+            return None
+        return endepoch
+
+    @property
+    def fid(self):
+        return self._store.fid[self._index].item()
+
+    @property
+    def markeridx(self):
+        return self._store.markeridx[self._index].item()
+
+    @property
+    def attr(self):
+        if self._store.labels is None:
+            return None
+        return self._store.labels[self._index]
+
+    def setMarkerIndex(self, m):
+        self._store.markeridx[self._index] = m
+
+    #
+    # Elements are drawn in runs: paint() projects the rows of the time window to canvas
+    # coordinates at once (the frame, see coordinateArrays.projectRows), sets the painter state
+    # for consecutive rows sharing a marker and opacity, and each element class draws the slots
+    # [first, last) of the frame at the run's opacity with as few painter calls as possible:
+    #   drawrun(canvas, qp, first, last, rows, image, opacity, labels)
+    # 'image' is the marker object of point runs and 'labels' the mask of slots to label.
+    #
+
+    @staticmethod
+    def frameparts(canvas, slot):
+        # Canvas vertices of each part of the element at 'slot' in the frame projected by paint
+        screen, partoffsets, vertexoffsets = canvas.framegeometry
+        return [
+            screen[vertexoffsets[p] : vertexoffsets[p + 1]]
+            for p in range(partoffsets[slot], partoffsets[slot + 1])
+        ]
+
+    @staticmethod
+    def screenparts(canvas, slot, row):
+        # Canvas QPolygonF of each part of the element at 'slot', kept for cached rendering
+        cache = canvas.store.screencache
+        parts = cache.get(row) if canvas.hispeed else None
+        if parts is None:
+            parts = [
+                coordinateArrays.toQPolygonF(part)
+                for part in TimeDataElement.frameparts(canvas, slot)
+            ]
+            if canvas.hispeed:
+                cache[row] = parts
+        return parts
+
+    @staticmethod
+    def drawlabels(canvas, qp, positions, rows):
+        # Draw the labels of 'rows' offset from their canvas 'positions'
+        labels = canvas.store.labels
+        if labels is None or len(rows) == 0:
+            return
+        deco = canvas.decoArgs
+        labelfont = qp.font()
+        labelfont.setPointSize(deco.fontsize)
+        labelfont.setWeight(QFont.ExtraBold)
+        qp.setFont(labelfont)
+        for (x, y), text in zip(positions.tolist(), labels[rows].tolist()):
+            if text:
+                drawrect = QtCore.QRectF(x + deco.xoffset, y + deco.yoffset, 500, 500)
+                qp.drawText(drawrect, text)
@@ -6,10 +6,13 @@
 # (c) 2021 The MITRE Corporation
 #
 
+import hashlib
+import os
 import sys
 import time
 import numpy as np
 import uuid
+import itertools
 
 from datetime import datetime
 from qgis.PyQt import QtCore
@@ -22,6 +25,7 @@ from PyQt5.QtCore import pyqtSignal
 from qgis.gui import QgsMapCanvasItem
 from qgis.core import (
     Qgis,
+    QgsPointXY,
     QgsRectangle,
     QgsMessageLog,
     QgsWkbTypes,
@@ -29,14 +33,28 @@ from qgis.core import (
     QgsExpressionContextScope,
     QgsProject,
     QgsCoordinateTransform,
+    QgsCsException,
     QgsApplication,
     QgsTask,
     QgsDateTimeFieldFormatter,
+    QgsFeatureRequest,
+    QgsRenderContext,
+    QgsExpression,
 )
 
 from .TimeDataPoint import TimeDataPoint
 from .TimeDataLine import TimeDataLine
 from .TimeDataPolygon import TimeDataPolygon
+from .TimeDataStore import TimeDataStore
+from .IntervalIndex import IntervalIndex
+from .LayerHistogram import LayerHistogram
+from .CoordinateArrays import coordinateArrays
+from .LayerCache import LayerCache
+from .SourceFingerprint import SourceFingerprint
+from .BulkTimeParser import bulkTimeParser
+from .TimeTilePager import TimeTilePager
+from .ExtentLoader import ExtentLoader
+from .SpatialGrid import SpatialGrid
 
 from .LayerSettings import Ui_LayerSettingsDialog
 from .LayerSettingsEditor import LayerSettingsEditor
@@ -51,13 +69,21 @@ class TimeDataLayer(QgsMapCanvasItem):
 
     #
     # This class implements a layer of time data elements as a QgsMapCanvasItem for rendering.
-    # The data is contained in an array and sorted by time. A parallel time index array
+    # The data is contained in a columnar TimeDataStore and sorted by time. A parallel time index array
     # is also maintained for rapid indexing by time window limits (start, end times). The times
     # are stored internally as float seconds to overcome an issue with the animation framework
     # when milliseconds are used, by which values are internally truncated during animation.
     # The data is also indexed by a chunk array to expedite random access.
     #
 
+    streamBatch = 50000  # Features in the first batch of a streaming load (see streamFeatures)
+    timesFirstMinFeatures = 200000  # Layers this large load their times first (see loadTimes)
+    screenCacheSlack = 10000  # Cached rows kept beyond twice the window (see screenRows)
+    alphaLevels = 32  # Opacity levels elements are drawn with (see frameLevels)
+    cullMargin = 64  # Pixels around the map view in which elements are still drawn
+    orderedProviders = ("postgres", "spatialite")  # Providers that sort in the data source
+    orderedStorage = ("GPKG", "SQLite")  # OGR formats that sort in the data source
+
     # TODO:  Combine these makeshift signal classes, or better yet, use pyqtSignal instead
     class LayerUpdate(QObject):
         # This is a makeshift signal that can be emitted to indicate the
@@ -77,6 +103,24 @@ class TimeDataLayer(QgsMapCanvasItem):
             for callback in self.updateCallbacks:
                 callback(caller)
 
+    class LayerExtend(QObject):
+        # This is a makeshift signal that can be emitted when rows are added to this layer's
+        # data while it is loading.  Unlike LayerUpdate it leaves the play window as it is.
+        def __init__(self):
+            super(TimeDataLayer.LayerExtend, self).__init__()
+            self.extendCallbacks = []
+            self.extendCallbacks.append(self.noop)
+
+        def noop(self, tdl):
+            pass
+
+        def connect(self, callback):
+            self.extendCallbacks.append(callback)
+
+        def emit(self, caller):
+            for callback in self.extendCallbacks:
+                callback(caller)
+
     class NeedsReload(QObject):
         # This is a makeshift signal that can be emitted to request reloading this layer's data
         def __init__(self):
@@ -118,6 +162,7 @@ class TimeDataLayer(QgsMapCanvasItem):
         QgsMapCanvasItem.__init__(self, canvas)
 
         self.layerUpdate = TimeDataLayer.LayerUpdate()
+        self.layerExtend = TimeDataLayer.LayerExtend()
         self.layerReload = TimeDataLayer.NeedsReload()
         self.layerClose = TimeDataLayer.CloseRequest()
 
@@ -165,6 +210,9 @@ class TimeDataLayer(QgsMapCanvasItem):
         #                        'coordinateTransform' for transforming geometries to correct CRS
         self.transform = self.canvas.transform()
         self.coordinateTransform = None
+        self.canvasaffine = None  # Map to canvas affine, updated at the start of each paint
+        self.framegeometry = None  # Canvas geometry of the rows drawn by the current paint
+        self.spatialgrid = None  # SpatialGrid of the store, built on first paint
 
         # Make sure the layer's CRS is the same as the project.
         # If not, prepare the coordinateTransform object
@@ -206,6 +254,7 @@ class TimeDataLayer(QgsMapCanvasItem):
         self.markers = []
         self.attrdict = {}
         self.basealpha = 1.0
+        self.fadelut = None  # Opacity of each fade level (see fadeLUT)
         self.paintxform = None
         self.catattr = ""
         self.isVisible = True
@@ -242,9 +291,26 @@ class TimeDataLayer(QgsMapCanvasItem):
         self.capturesettings()
 
     def resetData(self):
-        self.datalist = []
-        self.durationarray = []
-        self.drawdurations = []
+        if getattr(self, "pager", None) is not None:
+            self.pager.cancel()
+        self.pager = None  # TimeTilePager when the layer is loaded in time tiles
+        if getattr(self, "extentloader", None) is not None:
+            self.extentloader.cancel()
+        self.extentloader = None  # ExtentLoader when the layer follows the map extent
+        self.startextent = None  # Extent the ExtentLoader starts with (see prepareLoad)
+        if self.isPointLayer():
+            self.store = TimeDataStore(TimeDataPoint)
+        elif self.isLineLayer():
+            self.store = TimeDataStore(TimeDataLine)
+        else:
+            self.store = TimeDataStore(TimeDataPolygon)
+        self.histogram = LayerHistogram(self)
+        self.durationarray = None
+        self.timeindex = np.empty(0, dtype=np.float64)
+        self.mintime = 0
+        self.maxtime = 0
+        self.intervalindex = None
+        self.drawdurations = np.empty(0, dtype=np.int64)
 
         self.chunksize = 10000
         self.timechunkindex = []
@@ -252,6 +318,11 @@ class TimeDataLayer(QgsMapCanvasItem):
         self.endTimechunkindex = []
         self.endTimechunklist = []
 
+    @property
+    def datalist(self):
+        # The store can be indexed and iterated like a list of time data elements
+        return self.store
+
     def requestReload(self):
         # Only trigger if reload not already in progress
         if not self.isLoading:
@@ -273,8 +344,8 @@ class TimeDataLayer(QgsMapCanvasItem):
             "QTDC",
             Qgis.Info,
         )
-        self.updateLayer(features)
-        self.layerUpdate.emit(self)
+        if self.updateLayer(features):
+            self.layerUpdate.emit(self)
 
     def getName(self):
         return self.maplayer.name()
@@ -297,8 +368,7 @@ class TimeDataLayer(QgsMapCanvasItem):
                     self.sourceCRS, projectCRS, QgsProject.instance()
                 )
                 self.sourceCRS = projectCRS
-                for p in self.datalist:
-                    p.geometryTransform(self.coordinateTransform)
+                self.store.transformCoordinates(self.coordinateTransform)
 
     def transformationDone(self):
         self.transformTask = None
@@ -328,12 +398,14 @@ class TimeDataLayer(QgsMapCanvasItem):
 
     def refreshed(self):
         #
-        # Transform all data to canvas space when 'hispeed' (cached) rendering.  Called when canvas extent changes.
+        # Called when the canvas extent changes.  Canvas space geometry cached for 'hispeed'
+        # rendering is no longer valid; it is projected again as it is drawn (see screenRows),
+        # into the same buffers.
         #
-        if self.hispeed:
-            for point in self.datalist:
-                point.transform(self)
-            # QgsMessageLog.logMessage("Canvas refresh", "QTDC", Qgis.Info)
+        if self.extentloader is not None:
+            self.extentloader.follow()
+        self.store.screencache = {}
+        self.store.screenkey = None
 
     def setMessageBar(self, mbar):
         self.messageBar = mbar
@@ -364,21 +436,13 @@ class TimeDataLayer(QgsMapCanvasItem):
 
     def setrenderspeed(self, hispeed):
         #
-        # Set the rendering hispeed flag (cached, not cached) and notify the user if cached is selected.
-        # With cached rendering, data elements are transformed to canvas space with each extent change.
+        # Set the rendering hispeed flag (cached, not cached).
+        # With cached rendering, the canvas geometry of the elements drawn is kept until the
+        # canvas extent changes or the time window moves away from them.
         # With normal rendering (not cached) transformation is done on the fly.
         #
         self.hispeed = hispeed
         if self.hispeed:
-            if self.messageBar:
-                self.messageBar.pushMessage(
-                    "Cached rendering has been activated."
-                    + "  EXPECT DELAYS with map redraw/resizing events.",
-                    level=Qgis.Info,
-                    duration=5,
-                )
-            self.refreshed()
-            QgsApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
             QgsMessageLog.logMessage("Render speed set to HIGH.", "QTDC", Qgis.Info)
         else:
             QgsMessageLog.logMessage("Render speed set to LOW.", "QTDC", Qgis.Info)
@@ -403,8 +467,7 @@ class TimeDataLayer(QgsMapCanvasItem):
         if (
             not self.layerMarkers.randomized
         ):  # Reset marker index only if NOT randomized
-            for dataobject in self.datalist:
-                dataobject.setMarkerIndex(0)
+            self.store.markeridx[:] = 0
 
     #
     # The following methods classify the layer's geometry
@@ -430,23 +493,104 @@ class TimeDataLayer(QgsMapCanvasItem):
         # based on the type of rendering and use the features attributes to determine
         # the correct marker to use when necessary.
         #
+        QgsMessageLog.logMessage(
+            self.loadstate.epochfield + "  IS EPOCH IN TIMEDATALAYER", "QTDC", Qgis.Info
+        )
+        QgsMessageLog.logMessage(
+            str(self.loadstate.durationfield) + "  IS DURATION", "QTDC", Qgis.Info
+        )
+        QgsMessageLog.logMessage(str(self.randomized) + "  IS COLOR", "QTDC", Qgis.Info)
+
+        #
+        # Times are staged as NaN and the raw field values are collected alongside the staged rows.
+        # They are converted in bulk after the rows are committed (see BulkTimeParser).
+        epochvalues = []
+        durationvalues = []
+
+        def progress(fcount):
+            task.setProgress((fcount * 100) / totalfeatures)
+
+        retstatus, badRows, unrendered = self.stageFeatures(
+            task,
+            features,
+            attridx,
+            self.store,
+            epochvalues,
+            durationvalues,
+            progress if task is not None else None,
+        )
+        if not retstatus:  # Task was cancelled
+            return False, 0
+        retstatus, badRows = self.commitFeatures(
+            self.store, epochvalues, durationvalues, badRows
+        )
+        self.noteRows(self.store, unrendered)
+        return retstatus, badRows
+
+    def featureMarker(self, feature, attridx):
+        #
+        # Get the index of the marker a feature is rendered with, or -1 if the layer renderer
+        # does not render it
+        #
+        markerindex = 0
+        if self.layerMarkers.randomized:
+            #
+            # For 'color by attribute', use the value of this feature's attribute to get the
+            # marker index for rendering
+            #
+            attrvalue = str(feature.attribute(attridx))
+            markerindex = self.layerMarkers.attrdict.get(attrvalue)
+            if (
+                markerindex == None
+            ):  # The value wasn't found so add a new random symbol for it
+                markerindex = self.layerMarkers.addRandomMarker(attrvalue)
+
+        elif self.layerMarkers.categorized:
+            #
+            # Use the value of this feature's categorization attribute to get the marker index for rendering
+            #
+            attrvalue = str(feature.attributes()[attridx])
+            # markerindex points to the marker for this attr in the markers array
+            markerindex = self.layerMarkers.attrdict.get(attrvalue)
+            if (
+                markerindex == None
+            ):  # if this item isn't in a known category, use the 'unknown' marker (usually the last)
+                markerindex = len(self.layerMarkers.attrdict) - 1
+        elif self.layerMarkers.graduated:
+            #
+            # Use the value of this feature's symbol graduation attribute to get the marker index for rendering
+            #
+            attrvalue = feature.attribute(attridx)
+            markerindex = self.layerMarkers.getRangeMarkerIndex(attrvalue)
+        elif self.layerMarkers.ruled:
+            #
+            # Get the marker index for rendering by evaluating the rendering rules for this feature
+            markerindex = self.layerMarkers.getRuleMarkerIndex(feature)
+        return markerindex
+
+    def stageFeatures(
+        self, task, features, attridx, store, epochvalues, durationvalues, progress
+    ):
+        #
+        # Stage a row in 'store' for each of the provided features and collect their raw time
+        # values.  'progress' is called with the number of features staged so far.  Returns False
+        # if the task was cancelled, the number of features that failed to load and the number
+        # the layer renderer does not render.  Only 'store' is changed (see noteRows).
+        #
         errorct = 0
         fcount = 0
         badRows = 0
+        unrendered = 0
 
         #
-        # Get the time stamp and label fields to use
+        # Get the time stamp and label fields to use.  The label expression is copied so
+        # that features can be staged on several threads at once.
         epochfield = self.loadstate.epochfield
         durationfield = self.loadstate.durationfield
         labelfield = self.loadstate.labelExpression
+        if labelfield:
+            labelfield = QgsExpression(labelfield)
 
-        QgsMessageLog.logMessage(
-            epochfield + "  IS EPOCH IN TIMEDATALAYER", "QTDC", Qgis.Info
-        )
-        QgsMessageLog.logMessage(
-            str(durationfield) + "  IS DURATION", "QTDC", Qgis.Info
-        )
-        QgsMessageLog.logMessage(str(self.randomized) + "  IS COLOR", "QTDC", Qgis.Info)
         #
         # Set up expression context for processing label expressions
         context = QgsExpressionContext()
@@ -460,22 +604,9 @@ class TimeDataLayer(QgsMapCanvasItem):
                 if geometry:
 
                     fid = feature.id()
+                    epochvalue = feature[epochfield]
+                    durationvalue = feature[durationfield] if durationfield else None
 
-                    # Store time internally as float seconds for qt animation function, offset for utc as specified
-                    epoch = (
-                        self.dateFormatter.parseDate(feature[epochfield])
-                        + self.utcOffset
-                    )
-
-                    duration = None
-                    if durationfield:
-                        duration = (
-                            self.dateFormatter.parseDate(feature[durationfield])
-                            + self.utcOffset
-                        )
-                        self.useduration = True
-
-                    markerindex = 0
                     #
                     # If a label is specified, get the label value for this feature
                     # Date type fields are formatted by the default format for their type
@@ -501,96 +632,60 @@ class TimeDataLayer(QgsMapCanvasItem):
                         except:
                             labelvalue = str(fieldVal)
 
-                    attrvalue = None
-
-                    if self.layerMarkers.randomized:
-                        #
-                        # For 'color by attribute', use the value of this feature's attribute to get the
-                        # marker index for rendering
-                        #
-                        attrvalue = str(feature.attribute(attridx))
-                        markerindex = self.layerMarkers.attrdict.get(attrvalue)
-                        if (
-                            markerindex == None
-                        ):  # The value wasn't found so add a new random symbol for it
-                            markerindex = self.layerMarkers.addRandomMarker(attrvalue)
-
-                    elif self.layerMarkers.categorized:
-                        #
-                        # Use the value of this feature's categorization attribute to get the marker index for rendering
-                        #
-                        attrvalue = str(feature.attributes()[attridx])
-                        # markerindex points to the marker for this attr in the markers array
-                        markerindex = self.layerMarkers.attrdict.get(attrvalue)
-                        if (
-                            markerindex == None
-                        ):  # if this item isn't in a known category, use the 'unknown' marker (usually the last)
-                            markerindex = len(self.layerMarkers.attrdict) - 1
-                    elif self.layerMarkers.graduated:
-                        #
-                        # Use the value of this feature's symbol graduation attribute to get the marker index for rendering
-                        #
-                        attrvalue = feature.attribute(attridx)
-                        markerindex = self.layerMarkers.getRangeMarkerIndex(attrvalue)
-                    elif self.layerMarkers.ruled:
-                        #
-                        # Get the marker index for rendering by evaluating the rendering rules for this feature
-                        markerindex = self.layerMarkers.getRuleMarkerIndex(feature)
-
+                    markerindex = self.featureMarker(feature, attridx)
                     if markerindex < 0:  # skip to the next feature if no index found
-                        self.loadStatusMessage = (
-                            self.maplayer.name()
-                            + " - Features not rendered under the layer renderer settings have not been loaded."
-                        )
+                        unrendered += 1
                         continue
                     #
-                    # Create the appropriate time data element for this feature based on geometry
+                    # Add a row for this feature to the layer's data store based on geometry
                     #
 
                     if self.isPointLayer():
-                        point = TimeDataPoint(
-                            geometry, fid, markerindex, epoch, duration, labelvalue
+                        pt = geometry.asPoint()
+                        store.append(
+                            np.nan,
+                            np.nan,
+                            fid,
+                            markerindex,
+                            labelvalue,
+                            x=pt.x(),
+                            y=pt.y(),
                         )
                     elif self.isLineLayer():
-                        point = TimeDataLine(
-                            geometry,
+                        store.append(
+                            np.nan,
+                            np.nan,
                             fid,
                             markerindex,
-                            self,
-                            epoch,
-                            duration,
                             labelvalue,
+                            parts=TimeDataLine.geometryParts(geometry),
                         )
                     elif self.isPolyLayer():
-                        point = TimeDataPolygon(
-                            geometry,
+                        store.append(
+                            np.nan,
+                            np.nan,
                             fid,
                             markerindex,
-                            self,
-                            epoch,
-                            duration,
                             labelvalue,
+                            parts=TimeDataPolygon.geometryParts(geometry),
                         )
                     else:
                         # This shouldn't happen because unsupported layers are not loaded
                         continue
 
-                    # If the coordinateTransform has been set, we need to transform
-                    # the geometry so it matches the CRS of the project.
-                    if point and self.coordinateTransform:
-                        point.geometryTransform(self.coordinateTransform)
-
-                    self.appendPoint(point)
+                    epochvalues.append(epochvalue)
+                    if durationfield:
+                        durationvalues.append(durationvalue)
 
                     #
                     # Update the task progress
                     #
                     fcount += 1
-                    if task is not None:
-                        progress = (fcount * 100) / totalfeatures
-                        task.setProgress(progress)
-                        if task.isCanceled():
-                            return False, 0
+                    if progress is not None:
+                        progress(fcount)
+                    if task is not None and task.isCanceled():
+                        store.discard()
+                        return False, 0, 0
             except Exception as e:
                 etype, val, trace = sys.exc_info()
                 tbline = trace.tb_lineno
@@ -604,14 +699,244 @@ class TimeDataLayer(QgsMapCanvasItem):
                         "Exception loading FEATURE. " + str(e), "QTDC", Qgis.Info
                     )
                 badRows += 1
+
+        return True, badRows, unrendered
+
+    def noteRows(self, store, unrendered):
+        #
+        # Update the layer state that depends on rows loaded into 'store': whether the layer
+        # has durations, and the status message for features the renderer does not render.
+        # Staging and committing leave the layer alone so they can run in background tasks;
+        # this is called by the thread that owns the load (the load task or the main thread).
+        #
+        if self.loadstate.durationfield and len(store) > 0:
+            self.useduration = True
+        if unrendered > 0:
+            self.loadStatusMessage = (
+                self.maplayer.name()
+                + " - Features not rendered under the layer renderer settings have not been loaded."
+            )
+
+    def streamFeatures(
+        self,
+        task,
+        features,
+        totalfeatures,
+        attridx,
+        store,
+        publish=True,
+        presorted=False,
+    ):
+        #
+        # Ingest the features into 'store' in batches, keeping it in time order.  With 'publish',
+        # a copy of the data loaded so far is published to the layer after each batch so it can
+        # be displayed while the load continues.  Batches double in size so the copies and
+        # merges cost a small multiple of the final size.
+        #
+        # Features read in time order (see orderedRequest) are verified with one pass over each
+        # batch and appended without sorting.  Any batch out of order is sorted and merged as usual.
+        #
+        features = iter(features)
+        batchsize = TimeDataLayer.streamBatch
+        loaded = 0
+        badRows = 0
+        inorder = True
+        while True:
+            epochvalues = []
+            durationvalues = []
+            taken = 0
+
+            def batch():
+                nonlocal taken
+                for feature in itertools.islice(features, batchsize):
+                    taken += 1
+                    yield feature
+
+            def progress(fcount):
+                task.setProgress(((loaded + fcount) * 100) / totalfeatures)
+
+            retstatus, batchbad, unrendered = self.stageFeatures(
+                task,
+                batch(),
+                attridx,
+                store,
+                epochvalues,
+                durationvalues,
+                progress if task is not None else None,
+            )
+            if not retstatus:  # Task was cancelled
+                return False, 0
+            loaded += taken
+            first = len(store)
+            retstatus, batchbad = self.commitFeatures(
+                store, epochvalues, durationvalues, batchbad
+            )
+            self.noteRows(store, unrendered)
+            badRows += batchbad
+            if not store.mergeSorted(first) and presorted and inorder:
+                QgsMessageLog.logMessage(
+                    self.maplayer.name()
+                    + " features were not read in time order, sorting",
+                    "QTDC",
+                    Qgis.Info,
+                )
+                inorder = False
+
+            if taken < batchsize:  # All features have been read
+                return True, badRows
+            if publish and len(store) > 0:
+                self.publishStore(task, store.copy(), False)
+            batchsize *= 2
+
+    def loadTimes(self, task, maplayer, attridx, store):
+        #
+        # First phase of a two phase load: read only the feature ids and time fields (no
+        # geometry) and publish a time ordered store of them, so the histogram and time limits
+        # are available while the second phase loads geometry, markers and labels into 'store'.
+        # The times-only store is not drawn.  Returns False if the task was cancelled.
+        #
+        # The features the second phase drops are left out here too, so the histogram and time
+        # limits do not change when the geometry arrives: those without geometry (tested by the
+        # provider's filter, which reads but does not return the geometry) and those the layer
+        # renderer does not render (graduated ranges and rules, which need their attributes).
+        #
+        epochfield = self.loadstate.epochfield
+        durationfield = self.loadstate.durationfield
+        filtered = self.layerMarkers.graduated or self.layerMarkers.ruled
+        if filtered:
+            request = self.featureRequest(attridx)
+        else:
+            request = QgsFeatureRequest()
+            request.setSubsetOfAttributes(
+                [name for name in (epochfield, durationfield) if name],
+                maplayer.fields(),
+            )
+        if not self.layerMarkers.ruled:  # Rules may test the geometry
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setFilterExpression("$geometry IS NOT NULL")
+
+        times = TimeDataStore(store.elementclass)
+        times.hasgeometry = False
+        epochvalues = []
+        durationvalues = []
+        totalfeatures = max(maplayer.featureCount(), 1)
+        for fcount, feature in enumerate(maplayer.getFeatures(request)):
+            if fcount % 10000 == 0 and task is not None:
+                if task.isCanceled():
+                    return False
+                task.setProgress((fcount * 100) / totalfeatures)
+            if filtered and self.featureMarker(feature, attridx) < 0:
+                continue
+            times.append(np.nan, np.nan, feature.id(), 0)
+            epochvalues.append(feature[epochfield])
+            if durationfield:
+                durationvalues.append(feature[durationfield])
+
+        times.commit()
+        self.parseTimes(times, 0, epochvalues, durationvalues)
+        self.noteRows(times, 0)
+        times.sortByTime()
+        QgsMessageLog.logMessage(
+            "Loaded " + str(len(times)) + " times ahead of geometry", "QTDC", Qgis.Info
+        )
+        if len(times) > 0:
+            self.publishStore(task, times, False)
+        return True
+
+    def publishStore(self, task, store, final):
+        #
+        # Make 'store' the layer's data.  Loads run in a background task, so the store is
+        # passed to the task to be installed on the main thread (see LoadLayerTask).
+        # 'final' is False for the partial data published while a load continues.
+        #
+        if task is not None and hasattr(task, "publishStore"):
+            task.publishStore(store, final)
+        else:
+            self.installStore(store)
+
+    def installStore(self, store):
+        #
+        # Replace the layer's data with the time ordered rows of 'store' and regenerate the
+        # time index.  Must be called on the main thread since it changes what paint() draws.
+        # The data window is found again in the new rows, since a repaint may come before the
+        # next settime (e.g. a pan during playback).
+        #
+        self.store = store
+        self.histogram.clear()
+        self.refreshed()
+        self.buildtimeindex()
+        if self.pager is not None:
+            # The time limits of a paged layer are those of all its tiles
+            self.mintime, self.maxtime = self.pager.timerange
+        self.settime(self.ctime - self.timeshift)
+
+    def commitFeatures(self, store, epochvalues, durationvalues, badRows):
+        #
+        # Commit the staged rows of 'store', convert their times and transform their geometry.
+        # Only 'store' is changed, so background tasks may commit their own stores.
+        #
+        firstrow = store.commit()
+        badRows += self.parseTimes(store, firstrow, epochvalues, durationvalues)
+
+        # If the coordinateTransform has been set, we need to transform
+        # the new geometries so they match the CRS of the project.
+        if self.coordinateTransform:
+            store.transformCoordinates(self.coordinateTransform, firstrow)
+
         return True, badRows
 
+    def parseTimes(self, store, firstrow, epochvalues, durationvalues):
+        #
+        # Convert the raw time values of the rows committed from 'firstrow' onward and store them
+        # as float seconds (offset for utc as specified).  Rows whose times cannot be parsed are
+        # removed from the store; returns the number of rows removed.
+        #
+        if len(epochvalues) == 0:
+            return 0
+
+        # Store time internally as float seconds for qt animation function, offset for utc as specified
+        times, ok, slowcount = bulkTimeParser.parse(self.dateFormatter, epochvalues)
+        store.epoch[firstrow:] = times + self.utcOffset
+        if durationvalues:
+            endtimes, endok, endslowcount = bulkTimeParser.parse(
+                self.dateFormatter, durationvalues
+            )
+            store.endepoch[firstrow:] = endtimes + self.utcOffset
+            ok &= endok
+            slowcount += endslowcount
+
+        if slowcount > 0:
+            QgsMessageLog.logMessage(
+                str(slowcount) + " time values parsed individually", "QTDC", Qgis.Info
+            )
+
+        badRows = len(ok) - int(ok.sum())
+        if badRows > 0:
+            QgsMessageLog.logMessage(
+                str(badRows) + " features not loaded, their times could not be parsed",
+                "QTDC",
+                Qgis.Info,
+            )
+            store.select(np.flatnonzero(ok), firstrow)
+        return badRows
+
     def updateLayer(self, newData, task=None):
         #
         # Update the map layer with newData from the source layer.  TODO: This should be
         # called by a background task.
         # Generally this would be used for live PostGis sources that provide an update signal.
+        # Paged layers are not updated: their data is rebuilt from the time tiles as they load,
+        # which would drop the new rows.  Returns True if the layer was updated.
         #
+        if self.pager is not None:
+            QgsMessageLog.logMessage(
+                "Layer "
+                + self.maplayer.name()
+                + " is paged by time and cannot be updated, reload it instead",
+                "QTDC",
+                Qgis.Warning,
+            )
+            return False
 
         QgsMessageLog.logMessage(
             "UPDATE LAYER "
@@ -665,7 +990,9 @@ class TimeDataLayer(QgsMapCanvasItem):
             QgsMessageLog.logMessage("Enter update feature loop", "QTDC", Qgis.Info)
 
             # Main data ingest method
-            retstatus, badrows = self.ingestFeatures(
+            first = len(self.store)
+            revision = self.store.revision
+            retstatus, badRows = self.ingestFeatures(
                 task, features, totalfeatures, attridx
             )
             if not retstatus:  # Task was cancelled
@@ -686,17 +1013,12 @@ class TimeDataLayer(QgsMapCanvasItem):
                     Qgis.Info,
                 )
 
-            # Sort the layer points by time, and generate the parallel time index
+            # Merge the new points into the time order, and regenerate the parallel time index
             if totalfeatures > 0:
                 QgsMessageLog.logMessage(
-                    "UPDATE LAYER:  Ordering points.", "QTDC", Qgis.Info
+                    "UPDATE LAYER:  Merging points.", "QTDC", Qgis.Info
                 )
-                # The chunk lists will be rebuilt when ordering points
-                self.timechunkindex = []
-                self.timechunklist = []
-                self.endTimechunkindex = []
-                self.endTimechunklist = []
-                self.orderpoints()
+                self.mergepoints(first, revision)
             return True
 
         except Exception as ee:
@@ -713,6 +1035,16 @@ class TimeDataLayer(QgsMapCanvasItem):
             )
             raise ee
 
+    def prepareLoad(self, maplayer):
+        #
+        # Capture the main thread state loadmaplayer needs before its task starts: the canvas
+        # cannot be read from the task thread, so the extent a map extent load starts with
+        # is taken here
+        #
+        self.startextent = None
+        if self.loadstate.followextent and not self.loadstate.selectedonly:
+            self.startextent = ExtentLoader.canvasRect(self.canvas, maplayer)
+
     def loadmaplayer(self, task, maplayer):
         # This method should be called by a background task.
         #
@@ -739,11 +1071,7 @@ class TimeDataLayer(QgsMapCanvasItem):
             )
             retstatus = False
 
-            if sel:  # Get only selected features
-                features = maplayer.selectedFeatures()
-            else:
-                features = maplayer.getFeatures()
-            if features:
+            if not sel or maplayer.selectedFeatureCount() > 0:
                 #
                 # Prepare the layer marker properties
                 #
@@ -768,47 +1096,142 @@ class TimeDataLayer(QgsMapCanvasItem):
 
                 start_time = time.time()  # DEBUG added for timing
 
-                QgsMessageLog.logMessage("Main feature loop...", "QTDC", Qgis.Info)
-                QgsApplication.processEvents(QtCore.QEventLoop.ExcludeUserInputEvents)
-
-                #
-                # Set up expression context for processing label expressions
-                #
-                context = QgsExpressionContext()
-                scope = QgsExpressionContextScope()
-                context.appendScope(scope)
-
-                errorct = 0
-                totalfeatures = maplayer.featureCount()
-                fcount = 0
+                # The data is loaded into a store private to this task.  The layer's store is
+                # only replaced on the main thread when the task publishes the loaded data.
+                store = TimeDataStore(self.store.elementclass)
+
+                # Restore the processed data from the layer cache if it is still valid
+                cache = self.getCache()
+                cachekey = None
+                cachedstate = None
+                if cache:
+                    cachekey = self.cacheKey()
+                    cachedstate = cache.load(cachekey, store)
+
+                # Layers too large to hold in memory are loaded in time tiles that follow
+                # the playhead
+                paged = self.loadstate.pagesize and not sel
+                if paged and not TimeTilePager.supports(maplayer, self.dateFormatter):
+                    QgsMessageLog.logMessage(
+                        maplayer.name() + " cannot be paged, loading all features",
+                        "QTDC",
+                        Qgis.Info,
+                    )
+                    paged = False
+
+                if paged:
+                    self.pager = TimeTilePager(self, maplayer, attridx)
+                    store = self.pager.start(task)
+                    if store is None:  # Task was cancelled
+                        return False
+                elif self.loadstate.followextent and not sel:
+                    # Load the features in the map extent, and more as the map moves
+                    self.extentloader = ExtentLoader(self, maplayer, attridx)
+                    store = self.extentloader.start(task, self.startextent)
+                    if store is None:  # Task was cancelled
+                        return False
+                elif cachedstate is not None:
+                    self.useduration = cachedstate["useduration"]
+                    if self.layerMarkers.randomized:
+                        self.layerMarkers.attrdict.update(cachedstate["attrdict"])
+                    QgsMessageLog.logMessage(
+                        "Layer restored from cache in {:.3f} secs".format(
+                            time.time() - start_time
+                        ),
+                        "QTDC",
+                        Qgis.Info,
+                    )
+                else:
+                    QgsMessageLog.logMessage(
+                        "Main feature loop...", "QTDC", Qgis.Info
+                    )
+                    QgsApplication.processEvents(
+                        QtCore.QEventLoop.ExcludeUserInputEvents
+                    )
 
-                # Main data ingest method
-                retstatus, badrows = self.ingestFeatures(
-                    task, features, totalfeatures, attridx
-                )
+                    #
+                    # Set up expression context for processing label expressions
+                    #
+                    context = QgsExpressionContext()
+                    scope = QgsExpressionContextScope()
+                    context.appendScope(scope)
+
+                    errorct = 0
+                    totalfeatures = maplayer.featureCount()
+                    fcount = 0
+
+                    # For large layers, read the times alone first so the timeline can be
+                    # browsed while the geometry is loaded
+                    timesfirst = not sel and (
+                        totalfeatures >= TimeDataLayer.timesFirstMinFeatures
+                    )
+                    if timesfirst and not self.loadTimes(
+                        task, maplayer, attridx, store
+                    ):
+                        return False  # Task was cancelled
+
+                    # Fetch only the attributes used by ingest
+                    request = self.featureRequest(attridx)
+
+                    # Main data ingest method.
+                    # Let the provider return the features in time order if it can
+                    presorted = self.orderedRequest(request, maplayer)
+                    if sel:  # Get only selected features
+                        features = maplayer.getSelectedFeatures(request)
+                    else:
+                        features = maplayer.getFeatures(request)
+                    retstatus, badRows = self.streamFeatures(
+                        task,
+                        features,
+                        totalfeatures,
+                        attridx,
+                        store,
+                        not timesfirst,
+                        presorted,
+                    )
 
-                if not retstatus:  # Task was cancelled
-                    return retstatus
+                    if not retstatus:  # Task was cancelled
+                        return retstatus
 
-                elapsed_time = time.time() - start_time  # DEBUG
-                QgsMessageLog.logMessage(
-                    "Layer load elapsed time: {:.3f} secs".format(elapsed_time),
-                    "QTDC",
-                    Qgis.Info,
-                )
-                if badRows > 0:
+                    elapsed_time = time.time() - start_time  # DEBUG
                     QgsMessageLog.logMessage(
-                        str(badRows)
-                        + " features failed to load in layer "
-                        + maplayer.name(),
+                        "Layer load elapsed time: {:.3f} secs".format(
+                            elapsed_time
+                        ),
                         "QTDC",
                         Qgis.Info,
                     )
+                    if badRows > 0:
+                        QgsMessageLog.logMessage(
+                            str(badRows)
+                            + " features failed to load in layer "
+                            + maplayer.name(),
+                            "QTDC",
+                            Qgis.Info,
+                        )
 
-                # Sort the layer points by time, and generate the parallel time index
-                self.orderpoints()
-                if len(self.datalist) > 0:
+                # Sort the layer points by time and hand them to the layer, which generates
+                # the parallel time index
+                QgsMessageLog.logMessage(
+                    "Feature count..." + str(len(store)), "QTDC", Qgis.Info
+                )
+                if len(store) > 0:
                     retstatus = True
+                    # The main thread may reorder the published store in place (e.g. as
+                    # extents are merged), so the cache is written from a private copy
+                    saved = store.copy() if cache and cachedstate is None else None
+                    self.publishStore(task, store, True)
+                    if saved is not None:
+                        cache.save(
+                            cachekey,
+                            saved,
+                            {
+                                "useduration": self.useduration,
+                                "attrdict": self.layerMarkers.attrdict
+                                if self.layerMarkers.randomized
+                                else {},
+                            },
+                        )
                 else:
                     raise Exception(
                         "No features were loaded from layer " + maplayer.name()
@@ -834,59 +1257,175 @@ class TimeDataLayer(QgsMapCanvasItem):
         self.success = retstatus
         return retstatus
 
-    def appendPoint(self, pt):
-        self.datalist.append(pt)
+    def featureRequest(self, attridx):
+        #
+        # Build the feature request for ingest.  Only the attributes ingest reads are fetched:
+        # the time fields, the attribute used for marker selection, the attributes used by the
+        # renderer (category, graduation and rule expressions) and those referenced by the
+        # label expression.  Geometry is always fetched.
+        #
+        request = QgsFeatureRequest()
+        fields = self.maplayer.fields()
+        names = {self.loadstate.epochfield}
+        if self.loadstate.durationfield:
+            names.add(self.loadstate.durationfield)
+        if 0 <= attridx < fields.count():
+            names.add(fields.at(attridx).name())
+        renderer = self.maplayer.renderer()
+        if renderer:
+            names.update(renderer.usedAttributes(QgsRenderContext()))
+        labelfield = self.loadstate.labelExpression
+        if labelfield:
+            names.update(labelfield.referencedColumns())
+
+        if QgsFeatureRequest.ALL_ATTRIBUTES in names:
+            return request
+        request.setSubsetOfAttributes(
+            [name for name in names if fields.indexFromName(name) >= 0], fields
+        )
+        return request
+
+    def orderedRequest(self, request, maplayer):
+        #
+        # Ask the provider to return the features ordered by the epoch field, when the data
+        # source can sort them itself and the raw field values sort in time order (the date
+        # parsers that write time literals, see TimeTilePager).  Other providers would sort
+        # every feature in memory before returning the first, so they are left unordered.
+        # Returns True if the request was ordered.
+        #
+        provider = maplayer.providerType()
+        if not (
+            provider in TimeDataLayer.orderedProviders
+            or (
+                provider == "ogr"
+                and maplayer.storageType() in TimeDataLayer.orderedStorage
+            )
+        ):
+            return False
+        if not hasattr(self.dateFormatter, "literal"):
+            return False
+        request.addOrderBy(QgsExpression.quotedColumnRef(self.loadstate.epochfield))
+        return True
+
+    def getCache(self):
+        #
+        # Get the layer's ingest cache.  Loads of selected features only are not cached
+        # since the selection is not part of the cache key, and paged layers are never
+        # held in full.  Sources whose changes cannot be detected (most databases) are
+        # not cached either.
+        #
+        if (
+            self.loadstate.cachepath is None
+            or self.loadstate.selectedonly
+            or self.loadstate.pagesize
+            or self.loadstate.followextent
+            or not SourceFingerprint(self.maplayer).tracksChanges()
+        ):
+            return None
+        return LayerCache(self.loadstate.cachepath)
+
+    def cacheKey(self):
+        #
+        # Build the key that identifies the processed data of this layer.  Anything that changes
+        # the result of ingesting the layer (load settings, time parser, renderer, filter,
+        # source data, target CRS and the local time zone used by the local time parsers) is
+        # part of the key.
+        #
+        renderer = self.maplayer.renderer()
+        m = hashlib.sha256()
+        for part in (
+            self.loadstate.asJson(),
+            type(self.dateFormatter).__name__,
+            renderer.dump() if renderer else "",
+            SourceFingerprint(self.maplayer).hexdigest(),
+            self.maplayer.sourceCrs().toWkt(),
+            self.sourceCRS.toWkt(),
+            self.store.elementclass.__name__,
+            os.environ.get("TZ", ""),
+            "|".join(time.tzname) + "|" + str(time.timezone) + "|" + str(time.altzone),
+        ):
+            m.update(part.encode())
+            m.update(b"\x00")
+        return m.hexdigest()
 
     def orderpoints(self):
         # TODO:  For duration times, order points by duration end time and build separate
         #       duration time chunk index and chunk list
 
-        self.refreshed()
         QgsMessageLog.logMessage(
-            "Feature count..." + str(len(self.datalist)), "QTDC", Qgis.Info
+            "Feature count..." + str(len(self.store)), "QTDC", Qgis.Info
         )
 
-        # Sort the points of the layer by time and generate the parallel time index
-        sortedpoints = sorted(
-            self.datalist, key=lambda TimeDataElement: TimeDataElement.epoch
+        # Sort the rows of the layer by time (skipped if already in order) and generate the
+        # parallel time index
+        self.store.sortByTime()
+        self.buildtimeindex()
+
+    def mergepoints(self, first, revision):
+        #
+        # Merge the rows appended from 'first' onward into the time ordered rows of the layer.
+        # Only the new rows are sorted, and new data at or after the current last time is a pure append.
+        # The indexes are extended over an appended batch rather than rebuilt, when they were
+        # built for the rows of store 'revision' (the store before the batch was appended).
+        #
+        append = self.store.mergeSorted(first) and first > 0
+        grid = self.spatialgrid
+        if (
+            append
+            and grid is not None
+            and grid.store is self.store
+            and grid.revision == revision
+        ):
+            grid.extend(first)
+        QgsMessageLog.logMessage(
+            "Merged "
+            + str(len(self.store) - first)
+            + " features"
+            + (" (append)" if append else ""),
+            "QTDC",
+            Qgis.Info,
         )
-        self.datalist = sortedpoints
-        # self.timeindex = []
+        self.buildtimeindex(first if append else 0)
+
+    def buildtimeindex(self, first=0):
+        #
+        # Generate the time index for the time ordered rows of the layer.  The rows before
+        # 'first' are unchanged since the index was last built, so their part is reused.
+        #
+        epoch = self.store.epoch
+        pointct = len(epoch)
+
+        # The time index is a read-only view of the store's epoch column with cached limits
+        self.timeindex = epoch.view()
+        self.timeindex.flags.writeable = False
+        # Must call 'item' to get native Python object
+        self.mintime = epoch[0].item() if pointct > 0 else 0
 
         if self.useduration:
-            QgsMessageLog.logMessage("Generate duration array...", "QTDC", Qgis.Info)
-            self.durationarray = []
-            failCount = 0
-            for p in self.datalist:
-                try:
-                    self.durationarray.append([p.epoch, p.endepoch])
-                except:
-                    failCount += 1
-            self.durationarray = np.asarray(self.durationarray)
+            QgsMessageLog.logMessage("Generate interval index...", "QTDC", Qgis.Info)
+            self.durationarray = None  # Generated on demand by getdurationindex()
+            base = self.intervalindex if first > 0 else None
+            if base is not None and base.count != first:
+                base = None
+            self.intervalindex = IntervalIndex(epoch, self.store.endepoch, base)
+            if pointct > 0:
+                self.maxtime = self.intervalindex.runningmaxend[-1].item()
+            else:
+                self.maxtime = 0
             QgsMessageLog.logMessage(
-                "duration array size..."
-                + str(self.durationarray.size)
-                + ", "
-                + str(failCount)
-                + " FAILED records.",
+                "interval index size..." + str(pointct),
                 "QTDC",
                 Qgis.Info,
             )
         else:
+            self.maxtime = epoch[-1].item() if pointct > 0 else 0
             # The time index is arranged in a list of chunks that are
-            # referenced by a chunk index during animation
-            timechunk = []
-            pointct = 0
-            for p in self.datalist:
-                timechunk.append(p.epoch)
-                pointct = pointct + 1
-                if (pointct % self.chunksize) == 0:
-                    self.timechunklist.append(timechunk)
-                    self.timechunkindex.append(p.epoch)
-                    timechunk = []
-
-            if not (pointct % self.chunksize) == 0:
-                self.timechunklist.append(timechunk)
+            # referenced by a chunk index during animation.  The chunks are views of the store's
+            # epoch column and the chunk index holds the last time of each full chunk.
+            self.timechunklist = [
+                epoch[i : i + self.chunksize] for i in range(0, pointct, self.chunksize)
+            ]
+            self.timechunkindex = epoch[self.chunksize - 1 :: self.chunksize].tolist()
             QgsMessageLog.logMessage(
                 "Ordered points: "
                 + str(pointct)
@@ -898,46 +1437,53 @@ class TimeDataLayer(QgsMapCanvasItem):
             )
 
     def getdurationindex(self):
+        #
+        # Return the (start, end) times of the duration elements as a read-only array
+        #
+        if self.durationarray is None:
+            self.durationarray = np.column_stack((self.store.epoch, self.store.endepoch))
+            self.durationarray.flags.writeable = False
         return self.durationarray
 
+    def gettimecounts(self, edges):
+        #
+        # Return the histogram counts of the element times for the given bin edges, matching
+        # np.histogram (the last bin includes its right edge).  The rows are time ordered, so the
+        # cumulative count at each edge is a binary search on the epoch column.
+        #
+        if len(edges) < 2:
+            return np.zeros(0, dtype=np.int64)
+        epoch = self.store.epoch
+        cumulative = np.searchsorted(epoch, edges, side="left")
+        cumulative[-1] = np.searchsorted(epoch, edges[-1], side="right")
+        return np.diff(cumulative)
+
+    def getdurationcounts(self, times):
+        #
+        # Return the number of duration elements containing each of the given times
+        #
+        return self.intervalindex.coverage(times)
+
     def isdurationlayer(self):
         return self.useduration
 
     def gettimeindex(self):
         #
-        # Return a flat time index for the layer - used to generate the histogram
+        # Return the time index for the layer as a read-only view (no copy is made)
         #
-        if self.useduration:
-            return self.durationarray[..., 0]
-        else:
-            # Return a flat time index from the stack of chunks
-            return [item for chunk in self.timechunklist for item in chunk]
+        return self.timeindex
 
     def getmintime(self):
         #
         # Get the minimum time tag for this layer.
         #
-        if self.useduration:
-            # Must call 'item' to get native Python object
-            result = self.durationarray[0][0].item()
-            return result - self.timeshift
-        else:
-            result = self.timechunklist[0][0]
-            return result - self.timeshift
+        return self.mintime - self.timeshift
 
     def getmaxtime(self):
         #
-        # Get the maximum time tag for this layer
+        # Get the maximum time tag for this layer (the latest end time for duration layers)
         #
-        if self.useduration:
-            # Must call 'item' to get native Python object
-            result = np.amax(self.durationarray, 0)[1].item()
-            return result - self.timeshift
-        else:
-            maxchunk = len(self.timechunklist) - 1
-            maxtime = len(self.timechunklist[maxchunk]) - 1
-            result = self.timechunklist[maxchunk][maxtime]
-            return result - self.timeshift
+        return self.maxtime - self.timeshift
 
     def setColor(self, color):
         self.pen.setColor(color)
@@ -966,34 +1512,16 @@ class TimeDataLayer(QgsMapCanvasItem):
         #
         self.ctime = ctime + self.timeshift
         starttime = self.ctime - self.history
+        if self.pager is not None:
+            self.pager.follow(self.ctime, self.fwd)
         #
         # Processing for elements with start and end time attributes (duration)
         #
         if self.useduration:
             ndt = 0
-            self.drawdurations = np.argwhere(
-                (starttime <= self.durationarray[:, 1])
-                & (self.durationarray[:, 0] <= self.ctime)
-            )
-            if len(self.drawdurations) < 1:
-                if self.fwd:
-                    nextdurations = np.argwhere((starttime <= self.durationarray[:, 1]))
-                    if len(nextdurations) > 0:
-                        i = nextdurations[0][0]
-                        ndt = self.durationarray[i][0]
-                    else:
-                        di = self.durationarray.shape[0] - 1
-                        ndt = self.durationarray[di][1]
-                else:
-                    nextdurations = np.argwhere(
-                        (self.durationarray[:, 0] <= self.ctime)
-                    )
-                    if len(nextdurations) > 0:
-                        di = nextdurations.shape[0] - 1
-                        i = nextdurations[di][0]
-                        ndt = self.durationarray[i][1]
-                    else:
-                        ndt = self.durationarray[0][0]
+            self.drawdurations = self.intervalindex.overlapping(starttime, self.ctime)
+            if len(self.drawdurations) < 1 and self.intervalindex.count > 0:
+                ndt = self.intervalindex.nexttime(starttime, self.ctime, self.fwd)
                 ndt = ndt - self.timeshift
             return ndt
         #
@@ -1090,19 +1618,23 @@ class TimeDataLayer(QgsMapCanvasItem):
     def clearfilter(self):
         self.maplayer.setSubstring("")
 
+    def windowrows(self):
+        #
+        # Get the store rows of the elements in the current time window, in draw order
+        #
+        if self.useduration:
+            return self.drawdurations
+        return np.arange(self.startindex, self.endindex, self.incr)
+
     def getWindowDataIds(self):
         idList = []
-        name = self.maplayer.name()
         if self.isVisible:
             if self.useduration:
-                for i in range(len(self.drawdurations)):
-                    ddx = self.drawdurations[i][0]
-                    idList.append(self.datalist[ddx].fid)
+                idList = self.store.fid[self.windowrows()].tolist()
             else:
-                limit = len(self.datalist)
+                limit = len(self.store)
                 if self.startindex < limit and self.endindex < limit:
-                    for pdx in range(self.startindex, self.endindex, self.incr):
-                        idList.append(self.datalist[pdx].fid)
+                    idList = self.store.fid[self.windowrows()].tolist()
         return idList
 
     def getdisplayextent(self):
@@ -1110,189 +1642,212 @@ class TimeDataLayer(QgsMapCanvasItem):
         # Get the extent of the data in the current time window.
         #
         dataenvelope = None
-        if self.isVisible:
-            geometries = []
-            if self.useduration:
-                for i in range(len(self.drawdurations)):
-                    ddx = self.drawdurations[i][0]
-                    geometries.extend(self.datalist[ddx].geometrypoints())
-            else:
-                for pdx in range(self.startindex, self.endindex, self.incr):
-                    geometries.extend(self.datalist[pdx].geometrypoints())
-            if len(geometries) > 1:
-                dataenvelope = QgsRectangle()
-                for g in geometries:
-                    dataenvelope.combineExtentWith(g)
+        if self.isVisible and not self.store.hasgeometry:
+            # Geometry is still loading (see loadTimes), so use the map layer's extent
+            xform = QgsCoordinateTransform(
+                self.maplayer.crs(),
+                self.canvas.mapSettings().destinationCrs(),
+                QgsProject.instance(),
+            )
+            try:
+                layerextent = xform.transformBoundingBox(self.maplayer.extent())
+            except QgsCsException:
+                return
+            self.canvas.setExtent(layerextent)
+            self.canvas.refresh()
+        elif self.isVisible:
+            xs, ys = self.store.coordinates(self.windowrows())
+            valid = np.isfinite(xs) & np.isfinite(ys)
+            xs = xs[valid]
+            ys = ys[valid]
+            if len(xs) > 1:
+                dataenvelope = QgsRectangle(xs.min(), ys.min(), xs.max(), ys.max())
 
                 self.canvas.setExtent(dataenvelope)
                 self.canvas.zoomOut()
                 QgsMessageLog.logMessage(dataenvelope.asWktPolygon(), "QTDC", Qgis.Info)
-            elif len(geometries) == 1:
+            elif len(xs) == 1:
                 canvasextent = self.canvas.extent()
                 centerpt = canvasextent.center()
-                newcenter = geometries[0]
+                newcenter = QgsPointXY(xs[0], ys[0])
                 movevector = newcenter - centerpt
                 canvasextent += movevector
                 self.canvas.setExtent(canvasextent)
                 self.canvas.refresh()
 
-    def paint(self, qp, x, xx):
-        starttime = self.ctime - self.history
+    def screenRows(self, rows):
+        #
+        # Get the canvas geometry of 'rows' for 'hispeed' rendering (see projectRows).  The
+        # projected coordinates of the store are cached, keyed by the map to canvas affine
+        # (extent, scale and rotation) and the store revision, so only rows not drawn since the
+        # map last moved are projected.  The QPolygonF parts of drawn lines and polygons are
+        # cached alongside; when they grow well past the window, rows outside it are dropped.
+        #
+        store = self.store
+        if not store.hasgeometry:  # Nothing is drawn from a times-only store
+            return None
+        key = (self.canvasaffine, store.revision)
+        if store.screenkey != key:
+            # The buffers are reused while the store keeps its size, so moving the map
+            # only clears the valid marks
+            size = len(store.coords) if store.hasvertices else len(store)
+            if (
+                store.screencoords is None
+                or len(store.screencoords) != size
+                or len(store.screenvalid) != len(store)
+            ):
+                store.screencoords = np.empty((size, 2))
+                store.screenvalid = np.zeros(len(store), dtype=bool)
+            else:
+                store.screenvalid[:] = False
+            store.screencache = {}
+            store.screenkey = key
+
+        missing = rows[~store.screenvalid[rows]]
+        if len(missing) > 0:
+            if store.hasvertices:
+                partindex, _ = store.raggedIndex(store.featureoffsets, missing)
+                vertexindex, _ = store.raggedIndex(store.partoffsets, partindex)
+                store.screencoords[vertexindex] = coordinateArrays.project(
+                    self.canvasaffine, store.coords[vertexindex]
+                )
+            else:
+                store.screencoords[missing] = coordinateArrays.project(
+                    self.canvasaffine,
+                    np.column_stack((store.x[missing], store.y[missing])),
+                )
+            store.screenvalid[missing] = True
+
+        cache = store.screencache
+        if len(cache) > 2 * len(rows) + TimeDataLayer.screenCacheSlack:
+            store.screencache = {
+                row: cache[row] for row in rows.tolist() if row in cache
+            }
+        return coordinateArrays.projectRows(
+            self.canvasaffine, store, rows, store.screencoords
+        )
 
-        if self.isVisible and not self.isLoading:
+    def visibleRows(self, rows):
+        #
+        # Drop the rows whose bounding box is outside the map view (grown by cullMargin pixels
+        # for markers and line widths), keeping the draw order.  Large time windows are looked
+        # up in the layer's spatial grid, others are tested directly.
+        #
+        store = self.store
+        if not store.hasgeometry:  # Nothing is drawn from a times-only store
+            return rows[:0]
+        grid = self.spatialgrid
+        if grid is None or grid.store is not store or grid.revision != store.revision:
+            grid = self.spatialgrid = SpatialGrid(store)
+        extent = self.canvas.extent()
+        margin = TimeDataLayer.cullMargin * self.canvas.mapUnitsPerPixel()
+        rect = (
+            extent.xMinimum() - margin,
+            extent.yMinimum() - margin,
+            extent.xMaximum() + margin,
+            extent.yMaximum() + margin,
+        )
+
+        if not self.useduration and len(rows) > 0:
+            start = int(rows.min())
+            visible = grid.query(start, int(rows.max()) + 1, rect)
+            if visible is not None:
+                return visible if rows[0] == start else visible[::-1]
+        return rows[grid.meets(rows, rect)]
+
+    def frameLevels(self, rows):
+        #
+        # Get the opacity level (0 to alphaLevels - 1, a fraction of the base alpha, see
+        # fadeLUT) and the label visibility of each row drawn, in one pass over the window's times
+        #
+        count = len(rows)
+        top = TimeDataLayer.alphaLevels - 1
+        if self.useduration:
+            return np.full(count, top), np.full(count, self.dolabels)
+
+        pointtime = self.store.epoch[rows] - (self.ctime - self.history)
+        if not self.fwd:
+            pointtime = self.history - pointtime
+        if self.fademode and self.history > 0:
+            levels = np.rint(np.clip(pointtime / self.history, 0, 1) * top)
+            levels = levels.astype(np.int64)
+        else:
+            levels = np.full(count, top)
+        if self.recentlabels and self.dolabels:
+            labels = (self.history - pointtime) <= self.labeltime
+        else:
+            labels = np.full(count, self.dolabels)
+        return levels, labels
+
+    def fadeLUT(self):
+        # Opacity of each level of frameLevels, recomputed when the base alpha changes
+        if self.fadelut is None or self.fadelut[-1] != self.basealpha:
+            self.fadelut = self.basealpha * np.linspace(
+                0.0, 1.0, TimeDataLayer.alphaLevels
+            )
+        return self.fadelut
+
+    def paint(self, qp, x, xx):
+        #
+        # Draw the elements of the current time window in time order.  Consecutive elements
+        # sharing a marker and opacity level are drawn as a run, with the painter state set
+        # once per run and the run's geometry drawn in batched calls by the element class.
+        #
+        if self.isVisible and not self.isLoading and self.store.hasgeometry:
+            rows = self.visibleRows(self.windowrows())
+            if len(rows) == 0:
+                return
             qp.setPen(self.pen)
             origxform = qp.transform()
-            if self.useduration:
-                for i in range(len(self.drawdurations)):
-                    ddx = self.drawdurations[i][0]
-                    markerindex = self.datalist[ddx].markeridx
-                    if self.isPointLayer():
-                        qp.setPen(self.layerMarkers.markerProperties[markerindex].color)
-                        if (
-                            self.layerMarkers.categorized
-                            or self.layerMarkers.randomized
-                            or self.layerMarkers.graduated
-                            or self.layerMarkers.ruled
-                        ):
-                            ptmarker = self.layerMarkers.markerProperties[
-                                markerindex
-                            ].markerImage
-                            paintxform = self.layerMarkers.markerProperties[
-                                markerindex
-                            ].paintxform
-                        else:
-                            ptmarker = self.layerMarkers.markerProperties[0].markerImage
-                            paintxform = self.layerMarkers.markerProperties[
-                                0
-                            ].paintxform
-                    elif self.isLineLayer():
-                        qp.setPen(self.layerMarkers.markerProperties[markerindex].pen)
-                        ptmarker = None
-                        paintxform = None
-                    elif self.isPolyLayer():
-                        ptmarker = None
-                        paintxform = None
-                        qp.setPen(self.layerMarkers.markerProperties[markerindex].pen)
-                        qp.setBrush(
-                            self.layerMarkers.markerProperties[markerindex].brush
-                        )
-                    qp.setOpacity(self.basealpha)
-                    if self.hispeed:
-                        self.datalist[ddx].draw(
-                            self,
-                            qp,
-                            paintxform,
-                            ptmarker,
-                            self.basealpha,
-                            self.decoArgs,
-                            self.dolabels,
-                        )
-                    else:
-                        self.datalist[ddx].transformdraw(
-                            self,
-                            qp,
-                            paintxform,
-                            ptmarker,
-                            self.basealpha,
-                            self.decoArgs,
-                            self.dolabels,
-                        )
-                    qp.setTransform(origxform)
+            self.canvasaffine = coordinateArrays.canvasAffine(self)
+            # Project the geometry of the whole window at once
+            if self.hispeed:
+                self.framegeometry = self.screenRows(rows)
             else:
-                element = []
-                for pdx in range(self.startindex, self.endindex, self.incr):
-                    pointtime = self.datalist[pdx].epoch - starttime
-                    if not self.fwd:
-                        pointtime = self.history - pointtime
-                    if not self.fademode:
-                        alpha = self.basealpha
-                    else:
-                        alpha = (
-                            (pointtime) / self.history
-                        ) * self.basealpha  # Limit alpha to base alpha
-
-                    markerindex = self.datalist[pdx].markeridx
-                    # QgsMessageLog.logMessage("marker index: " + str(markerindex), "QTDC")
-                    if self.isPointLayer():
-                        if (
-                            self.layerMarkers.randomized
-                            or self.layerMarkers.categorized
-                            or self.layerMarkers.graduated
-                            or self.layerMarkers.ruled
-                        ):
-                            ptmarker = self.layerMarkers.markerProperties[
-                                markerindex
-                            ].markerImage
-                            paintxform = self.layerMarkers.markerProperties[
-                                markerindex
-                            ].paintxform
-                            qp.setOpacity(alpha)
-                        else:
-                            ptmarker = self.layerMarkers.markerProperties[0].markerImage
-                            paintxform = self.layerMarkers.markerProperties[
-                                0
-                            ].paintxform
-                        qp.setPen(self.layerMarkers.markerProperties[markerindex].color)
-                    elif self.isLineLayer():
-                        qp.setPen(self.layerMarkers.markerProperties[markerindex].pen)
-                        ptmarker = None
-                        paintxform = None
-                    elif self.isPolyLayer():
-                        ptmarker = None
-                        paintxform = None
-                        qp.setPen(self.layerMarkers.markerProperties[markerindex].pen)
-                        qp.setBrush(
-                            self.layerMarkers.markerProperties[markerindex].brush
-                        )
-
-                    qp.setOpacity(alpha)
-                    element = [qp, paintxform, ptmarker, alpha]
-
-                    showthislabel = self.dolabels
-                    if self.recentlabels and self.dolabels:
-                        showthislabel = (self.history - pointtime) <= self.labeltime
-                    if self.hispeed:
-                        self.datalist[pdx].draw(
-                            self,
-                            qp,
-                            paintxform,
-                            ptmarker,
-                            alpha,
-                            self.decoArgs,
-                            showthislabel,
-                        )
-                    else:
-                        self.datalist[pdx].transformdraw(
-                            self,
-                            qp,
-                            paintxform,
-                            ptmarker,
-                            alpha,
-                            self.decoArgs,
-                            showthislabel,
-                        )
+                self.framegeometry = coordinateArrays.projectRows(
+                    self.canvasaffine, self.store, rows
+                )
 
-                if len(element) >= 4:
-                    if self.hispeed:
-                        self.datalist[pdx].draw(
-                            self,
-                            element[0],
-                            element[1],
-                            element[2],
-                            element[3],
-                            self.decoArgs,
-                            self.dolabels,
-                        )
-                    else:
-                        self.datalist[pdx].transformdraw(
-                            self,
-                            element[0],
-                            element[1],
-                            element[2],
-                            element[3],
-                            self.decoArgs,
-                            self.dolabels,
-                        )
+            markers = self.store.markeridx[rows]
+            levels, labels = self.frameLevels(rows)
+            opacities = self.fadeLUT()[levels].tolist()
+            key = markers.astype(np.int64) * TimeDataLayer.alphaLevels + levels
+            breaks = np.flatnonzero(key[1:] != key[:-1]) + 1
+            firsts = np.concatenate(([0], breaks)).tolist()
+            lasts = np.concatenate((breaks, [len(rows)])).tolist()
+            multimarker = (
+                self.layerMarkers.categorized
+                or self.layerMarkers.randomized
+                or self.layerMarkers.graduated
+                or self.layerMarkers.ruled
+            )
+            elementclass = self.store.elementclass
+            properties = self.layerMarkers.markerProperties
+
+            for first, last in zip(firsts, lasts):
+                marker = properties[markers[first]]
+                image = None
+                if self.isPointLayer():
+                    qp.setPen(marker.color)
+                    image = marker if multimarker else properties[0]
+                    qp.setTransform(image.paintxform)
+                elif self.isLineLayer():
+                    qp.setPen(marker.pen)
+                elif self.isPolyLayer():
+                    qp.setPen(marker.pen)
+                    qp.setBrush(marker.brush)
+                runlabels = labels[first:last]
+                elementclass.drawrun(
+                    self,
+                    qp,
+                    first,
+                    last,
+                    rows,
+                    image,
+                    opacities[first],
+                    runlabels if runlabels.any() else None,
+                )
+            qp.setTransform(origxform)
 
     def updatePosition(self):
         mapextent = self.canvas.extent()
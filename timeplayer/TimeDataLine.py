@@ -9,111 +9,69 @@
 from qgis.core import *
 from qgis.PyQt import QtCore
 
-from qgis.PyQt.QtGui import QPen, QPainterPath, QFont
+from qgis.PyQt.QtGui import QPen, QPainterPath
 from qgis.PyQt.QtCore import Qt, QPointF
 
 from .TimeDataElement import TimeDataElement
+from .CoordinateArrays import coordinateArrays
 
 import numpy as np
 
 
 class TimeDataLine(TimeDataElement):
-    def __init__(
-        self, geometry, fid, markeridx, canvas, epoch, epochend=None, attr=None
-    ):
-        super().__init__(epoch, epochend)
-        self.path = QPainterPath()
-        self.canvas = canvas
-        self.geometry = geometry
-        self._fid = fid
-        self._attr = attr
-        self._markeridx = markeridx
-
-    @property
-    def fid(self):
-        return self._fid
-
-    @property
-    def markeridx(self):
-        return self._markeridx
+    hasvertices = True
 
     @property
     def geometry(self):
-        return self._geometry
-
-    @geometry.setter
-    def geometry(self, g):
-        self._geometry = []
-        if g.isMultipart():
-            for part in g.parts():
-                lastV = None
-                for v in part:
-                    vertex = QgsPointXY(v.toQPointF())
-                    self._geometry.append(vertex)
-        else:
-            linegeo = g.asPolyline()
-            lastV = None
-            for p in linegeo:
-                vertex = QgsPointXY(p.toQPointF())
-                self._geometry.append(vertex)
+        # The element's vertices (all parts) as QgsPointXY
+        return [
+            QgsPointXY(x, y)
+            for x, y in self._store.rowvertices(self._index).tolist()
+        ]
+
+    @staticmethod
+    def geometryParts(g):
+        # Get the (x list, y list) vertex coordinates of each part of a line geometry
+        parts = []
+        for part in g.constParts():
+            if part.numPoints() > 0:
+                parts.append((part.xVector(), part.yVector()))
+        if len(parts) == 0:
+            raise ValueError("Empty line geometry")
+        return parts
 
     def geometryTransform(self, xform):
-        for g in self._geometry:
-            p = QgsPoint(g)
-            p.transform(xform)
-            g.setX(p.x())
-            g.setY(p.y())
-
-    def setMarkerIndex(self, m):
-        self._markeridx = m
+        vertices = self._store.rowvertices(self._index)
+        coordinateArrays.transform(xform, vertices[:, 0], vertices[:, 1])
+        self._store.screenkey = None  # Cached canvas geometry is projected again
 
     def geometrypoints(self):
-        return self._geometry
+        return self.geometry
 
     def asQPointF(self):
-        qpt = QtCore.QPointF(self.x(), self.y())
-        return qpt
-
-    def transform(self, canvas, paintxform=None, label=None):
-        self.path = QPainterPath()
-        startpoint = None
-        for v in self._geometry:
-            drawpt = canvas.toCanvasCoordinates(v).toPoint()
-            if startpoint:
-                self.path.lineTo(drawpt.x(), drawpt.y())
-            else:
-                startpoint = drawpt
-                self.path.moveTo(drawpt.x(), drawpt.y())
-
-    def transformdraw(self, canvas, qp, paintxform, ptmarker, alpha, deco, label=None):
-        lastV = None
-        startpoint = None
-        self.path = QPainterPath()
-
-        for v in self._geometry:
-            drawpt = canvas.toCanvasCoordinates(v).toPoint()
-            if startpoint:
-                self.path.lineTo(drawpt.x(), drawpt.y())
-            else:
-                startpoint = drawpt
-                self.path.moveTo(drawpt.x(), drawpt.y())
-
-        qp.drawPath(self.path)
-
-        if label and self._attr:
-            self.drawlabel(qp, deco)
-
-        # Draw a single point in case path is too short to render at current scale
-        startpoint = QPointF(self.path.elementAt(0).x, self.path.elementAt(0).y)
-        qp.drawPoint(startpoint)
-
-        if deco.drawendpoints:
-            # #Draw endpoints of the line with green/red points for start/end of line
-            lastelement = self.path.elementCount() - 1
-            endpoint = QPointF(
-                self.path.elementAt(lastelement).x, self.path.elementAt(lastelement).y
-            )
-
+        x, y = self._store.rowvertices(self._index)[0]
+        return QPointF(x, y)
+
+    @staticmethod
+    def drawrun(canvas, qp, first, last, rows, image, opacity, labels):
+        #
+        # Draw the lines at slots [first, last) of the frame as a single path.  The start of each
+        # line is also drawn as a point in case the line is too short to render at the current
+        # scale, and with 'drawendpoints' the start and end are marked green and red.
+        #
+        screen, partoffsets, vertexoffsets = canvas.framegeometry
+        qp.setOpacity(opacity)
+        path = QPainterPath()
+        for slot, row in zip(range(first, last), rows[first:last].tolist()):
+            for polygon in TimeDataLine.screenparts(canvas, slot, row):
+                path.addPolygon(polygon)
+        qp.drawPath(path)
+
+        starts = screen[vertexoffsets[partoffsets[first:last]]]
+        qp.drawPoints(coordinateArrays.toQPolygonF(starts))
+
+        if canvas.decoArgs.drawendpoints:
+            ends = screen[vertexoffsets[partoffsets[first + 1 : last + 1]] - 1]
             origpen = qp.pen()
             startpen = QPen(
                 Qt.green, origpen.width() + 7, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin
@@ -122,51 +80,12 @@ class TimeDataLine(TimeDataElement):
                 Qt.red, origpen.width() + 7, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin
             )
             qp.setPen(startpen)
-            qp.drawPoint(startpoint)
+            qp.drawPoints(coordinateArrays.toQPolygonF(starts))
             qp.setPen(endpen)
-            qp.drawPoint(endpoint)
+            qp.drawPoints(coordinateArrays.toQPolygonF(ends))
             qp.setPen(origpen)
 
-    def draw(self, canvas, qp, paintxform, ptmarker, alpha, deco, label=None):
-
-        qp.drawPath(self.path)
-
-        # Draw a single point in case path is too short to render at current scale
-        startpoint = QPointF(self.path.elementAt(0).x, self.path.elementAt(0).y)
-        qp.drawPoint(startpoint)
-
-        if deco.drawendpoints:
-            # #Draw endpoints of the line with green/red points for start/end of line
-            lastelement = self.path.elementCount() - 1
-            endpoint = QPointF(
-                self.path.elementAt(lastelement).x, self.path.elementAt(lastelement).y
-            )
-
-            origpen = qp.pen()
-            startpen = QPen(
-                Qt.green, origpen.width() + 7, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin
-            )
-            endpen = QPen(
-                Qt.red, origpen.width() + 7, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin
+        if labels is not None:
+            TimeDataLine.drawlabels(
+                canvas, qp, starts[labels], rows[first:last][labels]
             )
-            qp.setPen(startpen)
-            qp.drawPoint(startpoint)
-            qp.setPen(endpen)
-            qp.drawPoint(endpoint)
-            qp.setPen(origpen)
-
-        if label and self._attr:
-            self.drawlabel(qp, deco)
-
-    def drawlabel(self, qp, deco):
-
-        drawx = self.path.elementAt(0).x
-        drawy = self.path.elementAt(0).y
-
-        labelfont = qp.font()
-        labelfont.setPointSize(deco.fontsize)
-        labelfont.setWeight(QFont.ExtraBold)
-        qp.setFont(labelfont)
-
-        drawrect = QtCore.QRectF(drawx + deco.xoffset, drawy + deco.yoffset, 500, 500)
-        qp.drawText(drawrect, self._attr)
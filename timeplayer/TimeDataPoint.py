@@ -8,97 +8,76 @@
 
 from qgis.core import *
 from qgis.PyQt import QtCore, QtGui
-from qgis.PyQt.QtCore import QPointF
-from qgis.PyQt.QtGui import QFont
+from qgis.PyQt.QtCore import QPointF, Qt
+from qgis.PyQt.QtGui import QPainter, QPixmap
 from .TimeDataElement import TimeDataElement
+from .CoordinateArrays import coordinateArrays
 
 
 class TimeDataPoint(TimeDataElement):
-    def __init__(
-        self, geometry, fid, markeridx, epoch, duration=None, attr=None, size=None
-    ):
-        super().__init__(epoch, duration)
-        pt = geometry.asPoint()
-        self._point = QgsPointXY(pt.x(), pt.y())
-        self._fid = fid
-        self._markeridx = markeridx
-        self._size = size
-        self._attr = attr
-
-    @property
-    def fid(self):
-        return self._fid
-
-    @property
-    def markeridx(self):
-        return self._markeridx
-
-    @property
-    def size(self):
-        return self._size
-
-    @property
-    def attr(self):
-        return self._attr
-
     @property
     def point(self):
-        return self._point
-
-    def setMarkerIndex(self, m):
-        self._markeridx = m
+        return QgsPointXY(self._store.x[self._index], self._store.y[self._index])
 
     def geometryTransform(self, xform):
-        p = QgsPoint(self._point)
+        p = QgsPoint(self.point)
         p.transform(xform)
-        self._point = QgsPointXY(p.x(), p.y())
+        self._store.x[self._index] = p.x()
+        self._store.y[self._index] = p.y()
+        self._store.screenkey = None  # Cached canvas geometry is projected again
 
     def geometrypoints(self):
-        return [self._point]
+        return [self.point]
 
     def asQPointF(self):
-        qpt = QtCore.QPointF(self.x(), self.y())
+        qpt = self.point.toQPointF()
         return qpt
 
-    def transform(self, canvas, paintxform=None):
-        self.drawpt = canvas.toCanvasCoordinates(self.point).toPoint()
-
-    def draw(self, canvas, qp, paintxform, ptmarker, alpha, labelargs, uselabel):
-
-        if paintxform:
-            qp.setTransform(paintxform)
-        if ptmarker:
-            qp.drawImage(self.drawpt, ptmarker)
-        else:
-            qp.drawPoint(self.drawpt)
-        if uselabel and self._attr:
-            self.drawlabel(qp, labelargs)
-
-    def transformdraw(
-        self, canvas, qp, paintxform, ptmarker, alpha, labelargs, uselabel
-    ):
-        self.drawpt = canvas.toCanvasCoordinates(self.point)
-
-        if paintxform:
-            qp.setTransform(paintxform)
-        if ptmarker:
-            qp.drawImage(self.drawpt, ptmarker)
+    @staticmethod
+    def fadedPixmap(marker, opacity):
+        #
+        # The marker's image rendered to a pixmap at 'opacity', so runs of any opacity draw at
+        # full opacity.  Markers are built by the load task, where pixmaps can't be created, so
+        # the pixmaps are made here on the first paint that needs them.
+        #
+        pixmap = marker.fadePixmaps.get(opacity)
+        if pixmap is None:
+            pixmap = QPixmap(marker.markerImage.size())
+            pixmap.fill(Qt.transparent)
+            painter = QPainter(pixmap)
+            painter.setOpacity(opacity)
+            painter.drawImage(0, 0, marker.markerImage)
+            painter.end()
+            marker.fadePixmaps[opacity] = pixmap
+        return pixmap
+
+    @staticmethod
+    def drawrun(canvas, qp, first, last, rows, image, opacity, labels):
+        #
+        # Draw the points at slots [first, last) of the frame, as copies of the marker image
+        # faded to 'opacity' in a single call (or as plain points without one), then the labels
+        # of the slots selected by the 'labels' mask.  The painter's transform offsets the marker
+        # by half its size and the fragments are placed by their center, hence the half size shift.
+        #
+        screen = canvas.framegeometry[0][first:last]
+        if image is not None and image.markerImage is not None:
+            pixmap = TimeDataPoint.fadedPixmap(image, opacity)
+            qp.setOpacity(1.0)
+            source = QtCore.QRectF(pixmap.rect())
+            centers = screen + (pixmap.width() / 2, pixmap.height() / 2)
+            qp.drawPixmapFragments(
+                [
+                    QPainter.PixmapFragment.create(QPointF(x, y), source)
+                    for x, y in centers.tolist()
+                ],
+                pixmap,
+            )
+            if labels is not None:
+                qp.setOpacity(opacity)
         else:
-            qp.drawPoint(self.drawpt)
-        if uselabel and self._attr:
-            self.drawlabel(qp, labelargs)
-
-    def drawlabel(self, qp, labelargs):
-
-        drawx = self.drawpt.x()
-        drawy = self.drawpt.y()
-
-        labelfont = qp.font()
-        labelfont.setPointSize(labelargs.fontsize)
-        labelfont.setWeight(QFont.ExtraBold)
-        qp.setFont(labelfont)
-
-        drawrect = QtCore.QRectF(
-            drawx + labelargs.xoffset, drawy + labelargs.yoffset, 500, 500
-        )
-        qp.drawText(drawrect, self._attr)
+            qp.setOpacity(opacity)
+            qp.drawPoints(coordinateArrays.toQPolygonF(screen))
+        if labels is not None:
+            TimeDataPoint.drawlabels(
+                canvas, qp, screen[labels], rows[first:last][labels]
+            )
@@ -9,135 +9,64 @@
 from qgis.core import *
 from qgis.PyQt import QtCore
 
-from qgis.PyQt.QtGui import QPen, QPainterPath, QPolygon, QFont
+from qgis.PyQt.QtGui import QPen, QPainterPath
 from qgis.PyQt.QtCore import Qt, QPointF
 
 from .TimeDataElement import TimeDataElement
+from .CoordinateArrays import coordinateArrays
 
 
 class TimeDataPolygon(TimeDataElement):
-    def __init__(
-        self, geometry, fid, markeridx, canvas, epoch, epochend=None, attr=None
-    ):
-        super().__init__(epoch, epochend)
-        self.geometry = geometry
-        self._fid = fid
-        self._markeridx = markeridx
-        self._attr = attr
-        self.poly = []
-
-    @property
-    def fid(self):
-        return self._fid
-
-    @property
-    def markeridx(self):
-        return self._markeridx
+    hasvertices = True
 
     @property
     def geometry(self):
-        return self._geometry
-
-    @property
-    def attr(self):
-        return self._attr
-
-    @geometry.setter
-    def geometry(self, g):
-        self._geometry = []
-        if g.isMultipart():
-            mp = g.asMultiPolygon()
-            for p in mp:
-                n = len(p[0])
-                part = []
-                for i in range(n):
-                    v = QgsPointXY(p[0][i])
-                    part.append(v)
-                self._geometry.append(part)
-        else:
-            polyG = g.asPolygon()
-            n = len(polyG[0])
-            part = []
-            for i in range(n):
-                v = QgsPointXY(polyG[0][i])
-                part.append(v)
-            self._geometry.append(part)
-
-    def setMarkerIndex(self, m):
-        self._markeridx = m
+        # The exterior ring vertices of each part as lists of QgsPointXY
+        return [
+            [QgsPointXY(x, y) for x, y in part.tolist()]
+            for part in self._store.rowparts(self._index)
+        ]
+
+    @staticmethod
+    def geometryParts(g):
+        # Get the (x list, y list) exterior ring coordinates of each part of a polygon geometry
+        parts = []
+        for part in g.constParts():
+            ring = part.exteriorRing()
+            if ring is not None and ring.numPoints() > 0:
+                parts.append((ring.xVector(), ring.yVector()))
+        if len(parts) == 0:
+            raise ValueError("Empty polygon geometry")
+        return parts
 
     def geometryTransform(self, xform):
-        for part in self._geometry:
-            for g in part:
-                p = QgsPoint(g)
-                p.transform(xform)
-                g.setX(p.x())
-                g.setY(p.y())
+        vertices = self._store.rowvertices(self._index)
+        coordinateArrays.transform(xform, vertices[:, 0], vertices[:, 1])
+        self._store.screenkey = None  # Cached canvas geometry is projected again
 
     def geometrypoints(self):
-        polypoints = []
-        for part in self._geometry:
-            for g in part:
-                p = QgsPointXY(g.toQPointF())
-                polypoints.append(p)
-        return polypoints
-
-    def transform(self, canvas, paintxform=None):
-        startpoint = None
-        self.poly = []
-        for part in self._geometry:
-            polypoints = []
-            for v in part:
-                polypoints.append(canvas.toCanvasCoordinates(v).toPoint())
-            self.poly.append(QPolygon(polypoints))
-            if len(polypoints) > 0:
-                self.polypoint = polypoints[0]
-
-    def transformdraw(
-        self, canvas, qp, paintxform, ptmarker, alpha, labelargs, label=None
-    ):
-        lastV = None
-        startpoint = None
-
-        self.poly = []
-        for part in self._geometry:
-            polypoints = []
-            for v in part:
-                polypoints.append(canvas.toCanvasCoordinates(v).toPoint())
-            self.poly.append(QPolygon(polypoints))
-            if len(polypoints) > 0:
-                self.polypoint = polypoints[0]
-
-        for poly in self.poly:
-            qp.drawPolygon(poly)
-        qp.drawPoint(
-            self.polypoint
-        )  # Draw a single point in case the polygon is too small to render
-        if label and self._attr:
-            self.drawlabel(qp, labelargs)
-
-    def draw(self, canvas, qp, paintxform, ptmarker, alpha, labelargs, label=None):
-        for poly in self.poly:
-            qp.drawPolygon(poly)
-
-        qp.drawPoint(
-            self.polypoint
-        )  # Draw a single point in case the polygon is too small to render
-
-        if label and self._attr:
-            self.drawlabel(qp, labelargs)
-
-    def drawlabel(self, qp, labelargs):
-
-        drawx = self.polypoint.x()
-        drawy = self.polypoint.y()
-
-        labelfont = qp.font()
-        labelfont.setPointSize(labelargs.fontsize)
-        labelfont.setWeight(QFont.ExtraBold)
-        qp.setFont(labelfont)
-
-        drawrect = QtCore.QRectF(
-            drawx + labelargs.xoffset, drawy + labelargs.yoffset, 500, 500
-        )
-        qp.drawText(drawrect, self._attr)
+        return [
+            QgsPointXY(x, y) for x, y in self._store.rowvertices(self._index).tolist()
+        ]
+
+    @staticmethod
+    def drawrun(canvas, qp, first, last, rows, image, opacity, labels):
+        #
+        # Draw the polygons at slots [first, last) of the frame.  Each part is drawn on its own,
+        # so overlapping polygons blend as before, but without painter state changes between
+        # them.  A point is drawn at each polygon in case it is too small to render.
+        #
+        screen, partoffsets, vertexoffsets = canvas.framegeometry
+        qp.setOpacity(opacity)
+        for slot, row in zip(range(first, last), rows[first:last].tolist()):
+            for polygon in TimeDataPolygon.screenparts(canvas, slot, row):
+                qp.drawPolygon(polygon)
+
+        # The first vertex of the last part of each polygon
+        anchors = screen[vertexoffsets[partoffsets[first + 1 : last + 1] - 1]]
+        qp.drawPoints(coordinateArrays.toQPolygonF(anchors))
+
+        if labels is not None:
+            TimeDataPolygon.drawlabels(
+                canvas, qp, anchors[labels], rows[first:last][labels]
+            )
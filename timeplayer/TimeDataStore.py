@@ -0,0 +1,421 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+from array import array
+
+import numpy as np
+
+from .CoordinateArrays import coordinateArrays
+
+class TimeDataStore:
+    """Columnar storage for the time data elements of a layer"""
+
+    #
+    # The element data of a layer is held in parallel NumPy columns with one row per feature
+    # (epoch, end epoch, fid, marker index and point x/y) rather than one Python object per feature.
+    # Rows are staged in compact typed buffers while features are ingested and are moved to the
+    # columns by commit().  Element objects (TimeDataPoint, TimeDataLine, TimeDataPolygon) are only
+    # created on demand as lightweight views of a single row, so indexing and iterating the store
+    # behaves like the element list it replaces.
+    #
+    # Line and polygon vertices are held in one contiguous (n, 2) float64 buffer ('coords').
+    # 'partoffsets' gives the first vertex of each part and 'featureoffsets' the first part of
+    # each row, so the vertices of row i are
+    #   coords[partoffsets[featureoffsets[i]] : partoffsets[featureoffsets[i + 1]]]
+    #
+
+    # Names of the array columns (used when persisting the store)
+    columns = (
+        "epoch",
+        "endepoch",
+        "fid",
+        "markeridx",
+        "x",
+        "y",
+        "coords",
+        "partoffsets",
+        "featureoffsets",
+    )
+
+    def __init__(self, elementclass):
+        self.elementclass = elementclass
+        self.hasvertices = elementclass.hasvertices
+        self.hasgeometry = True  # False for a store holding only times (first phase of a load)
+        self.revision = 0
+        self.clear()
+
+    def clear(self):
+        self.epoch = np.empty(0, dtype=np.float64)
+        self.endepoch = np.empty(0, dtype=np.float64)  # NaN when the element has no end time
+        self.fid = np.empty(0, dtype=np.int64)
+        self.markeridx = np.empty(0, dtype=np.int32)
+        self.x = np.empty(0, dtype=np.float64)  # Point coordinates (point layers only)
+        self.y = np.empty(0, dtype=np.float64)
+        self.labels = None  # Object array of label strings, only allocated if labels are present
+        # Ragged vertex buffer (line and polygon layers only)
+        self.coords = np.empty((0, 2), dtype=np.float64)
+        self.partoffsets = np.zeros(1, dtype=np.int64)
+        self.featureoffsets = np.zeros(1, dtype=np.int64)
+
+        # Canvas space geometry for cached ('hispeed') rendering: the projected vertices (or
+        # points) of the rows marked in 'screenvalid', the QPolygonF parts of drawn rows keyed
+        # by row, and the map to canvas affine and store revision they were projected for
+        # (see TimeDataLayer.screenRows)
+        self.screencoords = None
+        self.screenvalid = None
+        self.screencache = {}
+        self.screenkey = None
+        self.revision += 1
+        self.discard()
+
+    def discard(self):
+        # Drop any staged rows that have not been committed
+        self._epoch = array("d")
+        self._endepoch = array("d")
+        self._fid = array("q")
+        self._markeridx = array("i")
+        self._x = array("d")
+        self._y = array("d")
+        self._labels = []
+        self._haslabels = False
+        self._vx = array("d")
+        self._vy = array("d")
+        self._partlengths = array("q")
+        self._partcounts = array("q")
+
+    def append(
+        self,
+        epoch,
+        endepoch,
+        fid,
+        markeridx,
+        label=None,
+        x=np.nan,
+        y=np.nan,
+        parts=None,
+    ):
+        #
+        # Stage a single element row.  Staged rows are not visible until commit() is called.
+        # For line and polygon rows 'parts' is a list of (x list, y list) tuples, one per part.
+        #
+        self._epoch.append(epoch)
+        self._endepoch.append(np.nan if endepoch is None else endepoch)
+        self._fid.append(fid)
+        self._markeridx.append(markeridx)
+        self._x.append(x)
+        self._y.append(y)
+        self._labels.append(label)
+        if label is not None:
+            self._haslabels = True
+        if parts is not None:
+            for xs, ys in parts:
+                self._vx.extend(xs)
+                self._vy.extend(ys)
+                self._partlengths.append(len(xs))
+            self._partcounts.append(len(parts))
+
+    def stagedcount(self):
+        return len(self._epoch)
+
+    def commit(self):
+        #
+        # Move the staged rows to the end of the columns and return the index of the first new row.
+        #
+        first = len(self.epoch)
+        if len(self._epoch) == 0:
+            return first
+
+        self.epoch = np.concatenate((self.epoch, np.frombuffer(self._epoch)))
+        self.endepoch = np.concatenate((self.endepoch, np.frombuffer(self._endepoch)))
+        self.fid = np.concatenate(
+            (self.fid, np.frombuffer(self._fid, dtype=np.int64))
+        )
+        self.markeridx = np.concatenate(
+            (self.markeridx, np.frombuffer(self._markeridx, dtype=np.int32))
+        )
+        self.x = np.concatenate((self.x, np.frombuffer(self._x)))
+        self.y = np.concatenate((self.y, np.frombuffer(self._y)))
+
+        if self._haslabels or self.labels is not None:
+            labels = np.empty(len(self._labels), dtype=object)
+            labels[:] = self._labels
+            if self.labels is None:
+                self.labels = np.empty(first, dtype=object)
+            self.labels = np.concatenate((self.labels, labels))
+
+        if len(self._partcounts) > 0:
+            vertices = np.column_stack((np.frombuffer(self._vx), np.frombuffer(self._vy)))
+            self.coords = np.concatenate((self.coords, vertices))
+            self.partoffsets = np.concatenate(
+                (
+                    self.partoffsets,
+                    self.partoffsets[-1]
+                    + np.cumsum(np.frombuffer(self._partlengths, dtype=np.int64)),
+                )
+            )
+            self.featureoffsets = np.concatenate(
+                (
+                    self.featureoffsets,
+                    self.featureoffsets[-1]
+                    + np.cumsum(np.frombuffer(self._partcounts, dtype=np.int64)),
+                )
+            )
+
+        self.revision += 1
+        self.discard()
+        return first
+
+    def restore(self, columns, labels=None):
+        #
+        # Replace the contents of the store with previously saved columns (e.g. from the layer cache)
+        #
+        self.clear()
+        for name in TimeDataStore.columns:
+            setattr(self, name, columns[name])
+        self.labels = labels
+        self.revision += 1
+
+    def copy(self):
+        # Get a new store holding a copy of the committed rows
+        other = TimeDataStore(self.elementclass)
+        other.restore(
+            {name: getattr(self, name).copy() for name in TimeDataStore.columns},
+            None if self.labels is None else self.labels.copy(),
+        )
+        return other
+
+    def reorder(self, order, start=0):
+        #
+        # Rearrange the rows from 'start' onward by the given index array (e.g. the result of an
+        # argsort on epoch).  The order is relative to 'start'; rows before it are untouched.
+        #
+        rows = np.asarray(order, dtype=np.int64) + start
+        for name in ("epoch", "endepoch", "fid", "markeridx", "x", "y"):
+            column = getattr(self, name)
+            column[start:] = column[rows]
+        if self.labels is not None:
+            self.labels[start:] = self.labels[rows]
+        if self.hasvertices:
+            pstart = self.featureoffsets[start]
+            vstart = self.partoffsets[pstart]
+            partindex, featureoffsets = TimeDataStore.raggedIndex(
+                self.featureoffsets, rows
+            )
+            vertexindex, partoffsets = TimeDataStore.raggedIndex(
+                self.partoffsets, partindex
+            )
+            self.coords[vstart:] = self.coords[vertexindex]
+            self.partoffsets[pstart:] = vstart + partoffsets
+            self.featureoffsets[start:] = pstart + featureoffsets
+
+        # Cached canvas geometry is keyed by row so it is no longer valid for moved rows
+        if start == 0:
+            self.screencache = {}
+        else:
+            self.screencache = {k: v for k, v in self.screencache.items() if k < start}
+        self.revision += 1
+
+    def select(self, keep, start=0):
+        #
+        # Keep only the given rows from 'start' onward (indexes relative to 'start', ascending)
+        # and drop the others, e.g. rows whose times could not be parsed.  Rows before 'start'
+        # are untouched.
+        #
+        rows = np.asarray(keep, dtype=np.int64) + start
+        for name in ("epoch", "endepoch", "fid", "markeridx", "x", "y"):
+            column = getattr(self, name)
+            setattr(self, name, np.concatenate((column[:start], column[rows])))
+        if self.labels is not None:
+            self.labels = np.concatenate((self.labels[:start], self.labels[rows]))
+        if self.hasvertices:
+            pstart = self.featureoffsets[start]
+            vstart = self.partoffsets[pstart]
+            partindex, featureoffsets = TimeDataStore.raggedIndex(
+                self.featureoffsets, rows
+            )
+            vertexindex, partoffsets = TimeDataStore.raggedIndex(
+                self.partoffsets, partindex
+            )
+            self.coords = np.concatenate(
+                (self.coords[:vstart], self.coords[vertexindex])
+            )
+            self.partoffsets = np.concatenate(
+                (self.partoffsets[:pstart], vstart + partoffsets)
+            )
+            self.featureoffsets = np.concatenate(
+                (self.featureoffsets[:start], pstart + featureoffsets)
+            )
+
+        self.screencache = {k: v for k, v in self.screencache.items() if k < start}
+        self.revision += 1
+
+    def sortByTime(self):
+        #
+        # Put the rows in time order with a stable sort, so rows with the same time keep the
+        # order they were read in.  Rows that are already in time order (e.g. returned ordered by
+        # the provider) are detected with a single pass and not moved.
+        # Returns True if the rows had to be sorted.
+        #
+        epoch = self.epoch
+        if len(epoch) < 2 or np.all(epoch[1:] >= epoch[:-1]):
+            return False
+        self.reorder(np.argsort(epoch, kind="stable"))
+        return True
+
+    def mergeSorted(self, first):
+        #
+        # Restore time order after the rows from 'first' onward were appended to time ordered rows.
+        # Only the new rows are sorted and they are then merged into the existing order.
+        # Returns True if the new rows were a pure append (none earlier than the previous last row).
+        #
+        batch = self.epoch[first:]
+        if len(batch) == 0:
+            return True
+        if np.all(batch[1:] >= batch[:-1]):
+            batchorder = None
+            batchmin = batch[0]
+        else:
+            batchorder = np.argsort(batch, kind="stable")
+            batchmin = batch[batchorder[0]]
+
+        if first == 0 or batchmin >= self.epoch[first - 1]:
+            if batchorder is not None:
+                self.reorder(batchorder, first)
+            return True
+
+        if batchorder is None:
+            batchorder = np.arange(len(batch))
+        # Insert each new row after any existing rows with the same time
+        positions = np.searchsorted(
+            self.epoch[:first], batch[batchorder], side="right"
+        )
+        self.reorder(np.insert(np.arange(first), positions, first + batchorder))
+        return False
+
+    def transformCoordinates(self, xform, start=0):
+        #
+        # Transform the geometry of rows from 'start' onward with the provided QgsCoordinateTransform
+        #
+        if self.hasvertices:
+            vstart = self.partoffsets[self.featureoffsets[start]]
+            coordinateArrays.transform(
+                xform, self.coords[vstart:, 0], self.coords[vstart:, 1]
+            )
+        else:
+            coordinateArrays.transform(xform, self.x[start:], self.y[start:])
+        self.screencache = {}
+        self.revision += 1
+
+    def coordinates(self, rows):
+        #
+        # Get the x and y coordinate arrays of all vertices of the given rows
+        #
+        if not self.hasvertices:
+            return self.x[rows], self.y[rows]
+        partindex, _ = TimeDataStore.raggedIndex(self.featureoffsets, rows)
+        vertexindex, _ = TimeDataStore.raggedIndex(self.partoffsets, partindex)
+        vertices = self.coords[vertexindex]
+        return vertices[:, 0], vertices[:, 1]
+
+    def rowvertices(self, row):
+        # View of all vertices of a row (parts are concatenated)
+        first = self.partoffsets[self.featureoffsets[row]]
+        last = self.partoffsets[self.featureoffsets[row + 1]]
+        return self.coords[first:last]
+
+    def rowparts(self, row):
+        # Views of the vertices of each part of a row
+        return [
+            self.coords[self.partoffsets[p] : self.partoffsets[p + 1]]
+            for p in range(self.featureoffsets[row], self.featureoffsets[row + 1])
+        ]
+
+    @staticmethod
+    def raggedIndex(offsets, items):
+        #
+        # Given the offsets of a ragged buffer, get the index of the entries belonging to 'items'
+        # (in the order given) and the offsets of those items in the gathered buffer.
+        #
+        items = np.asarray(items, dtype=np.int64)
+        starts = offsets[items]
+        lengths = offsets[items + 1] - starts
+        newoffsets = np.zeros(len(items) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=newoffsets[1:])
+        index = np.arange(newoffsets[-1], dtype=np.int64) + np.repeat(
+            starts - newoffsets[:-1], lengths
+        )
+        return index, newoffsets
+
+    @staticmethod
+    def join(elementclass, stores):
+        #
+        # Get a new store holding the rows of the given stores one after another
+        #
+        joined = TimeDataStore(elementclass)
+        if len(stores) == 0:
+            return joined
+        columns = {
+            name: np.concatenate([getattr(store, name) for store in stores])
+            for name in ("epoch", "endepoch", "fid", "markeridx", "x", "y", "coords")
+        }
+        # Offsets of each store are shifted past the parts and vertices before it
+        partoffsets = [np.zeros(1, dtype=np.int64)]
+        featureoffsets = [np.zeros(1, dtype=np.int64)]
+        vertexbase = 0
+        partbase = 0
+        for store in stores:
+            partoffsets.append(store.partoffsets[1:] + vertexbase)
+            featureoffsets.append(store.featureoffsets[1:] + partbase)
+            vertexbase += store.partoffsets[-1]
+            partbase += store.featureoffsets[-1]
+        columns["partoffsets"] = np.concatenate(partoffsets)
+        columns["featureoffsets"] = np.concatenate(featureoffsets)
+
+        labels = None
+        if any(store.labels is not None for store in stores):
+            labels = np.concatenate(
+                [
+                    store.labels
+                    if store.labels is not None
+                    else np.empty(len(store), dtype=object)
+                    for store in stores
+                ]
+            )
+        joined.restore(columns, labels)
+        return joined
+
+    def nbytes(self):
+        # Approximate memory used by the columns (excluding label strings)
+        total = (
+            self.epoch.nbytes
+            + self.endepoch.nbytes
+            + self.fid.nbytes
+            + self.markeridx.nbytes
+            + self.x.nbytes
+            + self.y.nbytes
+            + self.coords.nbytes
+            + self.partoffsets.nbytes
+            + self.featureoffsets.nbytes
+        )
+        if self.labels is not None:
+            total += self.labels.nbytes
+        return total
+
+    def __len__(self):
+        return len(self.epoch)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.epoch)
+        if index < 0 or index >= len(self.epoch):
+            raise IndexError("TimeDataStore index out of range")
+        return self.elementclass(self, int(index))
+
+    def __iter__(self):
+        for index in range(len(self.epoch)):
+            yield self.elementclass(self, index)
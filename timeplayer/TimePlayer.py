@@ -253,10 +253,9 @@ class TimePlayer(QObject):
 
     def getdata(self):
         # Returnes an merged time index collection for data in all layers
-        data = []
-        for l in self.layers:
-            data.extend(l.gettimeindex())
-        return data
+        if len(self.layers) == 0:
+            return np.empty(0, dtype=np.float64)
+        return np.concatenate([l.gettimeindex() for l in self.layers])
 
     def setDataLimits(self):
         # Establish the time limits of all loaded data and update
@@ -410,6 +409,17 @@ class TimePlayer(QObject):
             "TIMEPLAYER updated " + timedatalayer.getName(), "QTDC", Qgis.Info
         )
 
+    def extended(self, timedatalayer):
+        # Called when more of a loading layer's data arrives.  The time limits are widened,
+        # the histograms redrawn and the current frame redrawn, but the play window, the
+        # timeline zoom and the play position are kept.
+        if timedatalayer in self.layers and not timedatalayer.isLoading:
+            self.mint = min(timedatalayer.getmintime(), self.mint)
+            self.maxt = max(timedatalayer.getmaxtime(), self.maxt)
+            self.mainUI.extendLoading(timedatalayer)
+            if not self.isAnimating():
+                self.showdata(self.currentTime)
+
     def reloadmaplayer(self, timedatalayer):
         QgsMessageLog.logMessage(
             "*****************  Request to reload layer " + timedatalayer.getName(),
@@ -452,6 +462,7 @@ class TimePlayer(QObject):
             timedatalayer = TimeDataLayer(self.canvas, maplayer, loadstate)
 
             timedatalayer.layerUpdate.connect(self.updated)
+            timedatalayer.layerExtend.connect(self.extended)
             timedatalayer.layerReload.connect(self.reloadmaplayer)
 
             gc.collect()  # garbage collection
@@ -0,0 +1,252 @@
+#
+# NOTICE:
+# Portions of this software were produced for the U. S. Government
+# under Contract No. FA8702-19-C-0001 and W56KGU-18-D-0004, and is subject to the Rights in Noncommercial Computer Software
+# and Noncommercial Computer Software Documentation Clause DFARS 252.227-7014 (FEB 2014)
+# (c) 2022 The MITRE Corporation
+#
+
+import math
+from collections import OrderedDict
+
+from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsExpression,
+    QgsMessageLog,
+    QgsTask,
+    QgsVectorLayerFeatureSource,
+)
+
+from .TimeDataStore import TimeDataStore
+
+
+class TimeTilePager:
+    """Loads a time data layer one time tile at a time around the playhead"""
+
+    #
+    # For layers too large to hold in memory, the layer's time range is divided into tiles of
+    # 'tilesize' seconds.  Tile i holds the features with a start time in
+    #   [origin + i * tilesize, origin + (i + 1) * tilesize)
+    # and is fetched with a filter expression on the epoch field, ordered by the provider, so
+    # providers with an index on the field only read the rows of the tile.
+    #
+    # The tiles covering the current data window are kept loaded along with 'prefetch' tiles
+    # ahead in the play direction, which are fetched by background tasks.  The layer's store
+    # is the concatenation of the loaded tiles.  Tiles that are no longer wanted are evicted,
+    # least recently used first, when the loaded tiles exceed the memory budget.
+    #
+    # Durations are paged by start time, so an interval starting before the loaded tiles is
+    # not shown.
+    #
+
+    prefetch = 2  # Tiles loaded ahead of the playhead
+    providers = ("postgres", "ogr", "spatialite")  # Providers that can filter by time
+
+    def __init__(self, datalayer, maplayer, attridx):
+        self.datalayer = datalayer
+        self.maplayer = maplayer
+        self.attridx = attridx
+        self.tilesize = float(datalayer.loadstate.pagesize)
+        self.budget = datalayer.loadstate.pagebudget * 1024 * 1024
+        self.tiles = OrderedDict()  # Loaded tiles by index, least recently used first
+        self.pending = {}  # Background tasks by tile index
+        self.wanted = set()
+        self.current = None
+        self.extent = (0, 0)  # First and last start times, which the tiles cover
+        self.timerange = (0, 0)  # Time limits of the layer, including end times
+        self.tilecount = 0
+
+    @staticmethod
+    def supports(maplayer, dateFormatter):
+        # Can the layer be paged?  The time parser must be able to write time literals.
+        return maplayer.providerType() in TimeTilePager.providers and hasattr(
+            dateFormatter, "literal"
+        )
+
+    def start(self, task):
+        #
+        # Find the time range of the layer and load the first tile (called from the load task).
+        # Returns the store for the layer.
+        #
+        layer = self.datalayer
+        fieldindex = self.maplayer.fields().indexFromName(layer.loadstate.epochfield)
+        first = layer.dateFormatter.parseDate(self.maplayer.minimumValue(fieldindex))
+        last = layer.dateFormatter.parseDate(self.maplayer.maximumValue(fieldindex))
+        self.extent = (first + layer.utcOffset, last + layer.utcOffset)
+        self.tilecount = self.tileindex(self.extent[1]) + 1
+        self.timerange = self.extent
+        if layer.loadstate.durationfield:
+            # Intervals are paged by start time, but the layer lasts until the last end time
+            endfield = layer.loadstate.durationfield
+            endindex = self.maplayer.fields().indexFromName(endfield)
+            end = layer.dateFormatter.parseDate(self.maplayer.maximumValue(endindex))
+            if end is not None:
+                self.timerange = (
+                    self.extent[0],
+                    max(self.extent[1], end + layer.utcOffset),
+                )
+        QgsMessageLog.logMessage(
+            "Paging "
+            + self.maplayer.name()
+            + " in "
+            + str(self.tilecount)
+            + " tiles of "
+            + str(self.tilesize)
+            + " secs",
+            "QTDC",
+            Qgis.Info,
+        )
+
+        result = self.loadTile(task, self.maplayer, self.tileRequest(0))
+        if result is None:  # Task was cancelled
+            return None
+        store, unrendered = result
+        layer.noteRows(store, unrendered)
+        self.tiles[0] = store
+        self.wanted = {0}
+        return store
+
+    def tileindex(self, t):
+        return int(math.floor((t - self.extent[0]) / self.tilesize))
+
+    def tileExpression(self, index):
+        # Filter expression selecting the features of a tile, in the raw values of the epoch field
+        layer = self.datalayer
+        start = self.extent[0] + index * self.tilesize - layer.utcOffset
+        field = QgsExpression.quotedColumnRef(layer.loadstate.epochfield)
+        return (
+            field
+            + " >= "
+            + layer.dateFormatter.literal(start)
+            + " AND "
+            + field
+            + " < "
+            + layer.dateFormatter.literal(start + self.tilesize)
+        )
+
+    def tileRequest(self, index):
+        #
+        # Build the feature request for a tile.  It reads the map layer's renderer and fields,
+        # so it is built before a background task starts rather than in the task.
+        #
+        layer = self.datalayer
+        request = layer.featureRequest(self.attridx)
+        request.setFilterExpression(self.tileExpression(index))
+        request.addOrderBy(QgsExpression.quotedColumnRef(layer.loadstate.epochfield))
+        return request
+
+    def loadTile(self, task, source, request):
+        #
+        # Read the features of a tile from 'source' (the map layer or a feature source) with
+        # the tile's 'request' into a new time ordered store.  Only the new store is written,
+        # so this can run in a background task.  Returns the store and the number of features
+        # the renderer does not render (see TimeDataLayer.noteRows), or None if cancelled.
+        #
+        layer = self.datalayer
+        store = TimeDataStore(layer.store.elementclass)
+        epochvalues = []
+        durationvalues = []
+        retstatus, badrows, unrendered = layer.stageFeatures(
+            task,
+            source.getFeatures(request),
+            self.attridx,
+            store,
+            epochvalues,
+            durationvalues,
+            None,
+        )
+        if not retstatus:  # Task was cancelled
+            return None
+        layer.commitFeatures(store, epochvalues, durationvalues, badrows)
+        store.mergeSorted(0)
+        return store, unrendered
+
+    def follow(self, ctime, fwd):
+        #
+        # Called as the layer's time changes: schedule the tiles for the data window ending at
+        # 'ctime' and those ahead of it in the play direction
+        #
+        index = self.tileindex(ctime)
+        if (index, fwd) == self.current:
+            return
+        self.current = (index, fwd)
+
+        first = self.tileindex(ctime - self.datalayer.history)
+        if fwd:
+            wanted = list(range(index, index + TimeTilePager.prefetch + 1))
+            wanted += list(range(index - 1, first - 1, -1))
+        else:
+            wanted = list(range(index, first - TimeTilePager.prefetch - 1, -1))
+        wanted = [i for i in wanted if 0 <= i < self.tilecount]
+        self.wanted = set(wanted)
+
+        for i in wanted:
+            if i in self.tiles:
+                self.tiles.move_to_end(i)
+            elif i not in self.pending:
+                self.schedule(i)
+
+    def schedule(self, index):
+        #
+        # Load a tile in a background task.  The feature source and request are created here
+        # on the main thread.  The task passes no result to on_finished when it returns None
+        # (cancelled), so 'result' defaults to None.
+        #
+        source = QgsVectorLayerFeatureSource(self.maplayer)
+        request = self.tileRequest(index)
+        task = QgsTask.fromFunction(
+            "Loading " + self.maplayer.name() + " tile " + str(index),
+            self.loadTile,
+            source,
+            request,
+            on_finished=lambda exception, result=None: self.loaded(
+                index, exception, result
+            ),
+        )
+        self.pending[index] = task
+        QgsApplication.taskManager().addTask(task)
+
+    def loaded(self, index, exception, result):
+        #
+        # Install a tile loaded in the background and update the layer state that depends on
+        # its rows (called on the main thread)
+        #
+        self.pending.pop(index, None)
+        if self.datalayer.pager is not self:  # The layer was reset
+            return
+        if exception is not None:
+            QgsMessageLog.logMessage(
+                "Tile " + str(index) + " failed to load: " + str(exception),
+                "QTDC",
+                Qgis.Warning,
+            )
+            return
+        if result is None:  # Task was cancelled
+            return
+        store, unrendered = result
+        self.datalayer.noteRows(store, unrendered)
+        self.tiles[index] = store
+        self.evict()
+        self.datalayer.installStore(
+            TimeDataStore.join(
+                self.datalayer.store.elementclass,
+                [self.tiles[i] for i in sorted(self.tiles)],
+            )
+        )
+        self.datalayer.layerExtend.emit(self.datalayer)
+
+    def evict(self):
+        # Drop the least recently used tiles that are not wanted until the tiles fit the budget
+        size = sum(store.nbytes() for store in self.tiles.values())
+        for i in list(self.tiles):
+            if size <= self.budget:
+                break
+            if i not in self.wanted:
+                size -= self.tiles.pop(i).nbytes()
+
+    def cancel(self):
+        # Stop loading tiles (e.g. when the layer is reloaded or removed)
+        for task in self.pending.values():
+            task.cancel()
+        self.pending = {}